@@ -1,10 +1,11 @@
 import asyncio
 import logging
 import random
+import re
 import sys
 from typing import List, Dict, Any
 
-from config import BOT_PERSONALITY, PROMPT_REPLY_TOKEN_BUDGET, TEMPERATURE, MEMORY_ENABLED
+from config import BOT_PERSONALITY, PROMPT_REPLY_TOKEN_BUDGET, TEMPERATURE, MEMORY_ENABLED, AI_MAX_CONCURRENCY
 
 # Import OpenAI clients (v1+)
 try:
@@ -42,9 +43,26 @@ RETRYABLE_ERROR_PATTERNS = [
     "service unavailable", "503", "unavailable", "down",
     "connection", "network", "unreachable", "refused"
 ]
+# One scan over the error text instead of a substring search per pattern
+_RETRYABLE_ERROR_RE = re.compile("|".join(map(re.escape, RETRYABLE_ERROR_PATTERNS)), re.IGNORECASE)
 
 logger = logging.getLogger(__name__)
 
+# Greeting templates, formatted with the user's display name
+_NAMED_GREETINGS = (
+    "Hey %s! 💕 How are you doing today?",
+    "Hi %s! 🌸 I've been thinking about you!",
+    "Hello %s! ✨ I'm so happy to chat with you!",
+    "Hey there %s! 💖 How's your day going?",
+    "Hi beautiful %s! 🌺 I missed you!",
+)
+_ANONYMOUS_GREETINGS = (
+    "Hey there! 💕 How are you doing today?",
+    "Hi! 🌸 I'm so happy to chat with you!",
+    "Hello! ✨ How's your day going?",
+    "Hey! 💖 I'm here for you!",
+)
+
 
 class ModelClient:
     """Abstracts interaction with different LLM providers"""
@@ -55,6 +73,10 @@ class ModelClient:
         
         self.llm_config = dict(llm_config or {})
         self.provider = provider
+        # Only set for the lmstudio provider when LMStudioManager is importable
+        self.lm_studio_manager = None
+        self.auto_load_model = False
+        self.max_load_wait = 300
         
         if provider == "azure":
             from config import AZURE_ENDPOINT, AZURE_API_KEY, AZURE_MODEL
@@ -102,8 +124,6 @@ class ModelClient:
                 self.max_load_wait = lmstudio_max_load_wait
                 logger.info("LMStudioManager initialized (auto_load=%s)", lmstudio_auto_load)
             else:
-                self.lm_studio_manager = None
-                self.auto_load_model = False
                 logger.warning("LMStudioManager not available - model auto-loading disabled")
             
             logger.info("ModelClient initialized with LM Studio provider - Model: %s, Base URL: %s", lmstudio_model, lmstudio_base_url)
@@ -198,9 +218,9 @@ class ModelClient:
                 info["api_version"] = self.client.api_version
             
             # Add LM Studio specific info
-            if self.provider == "lmstudio" and hasattr(self, 'lm_studio_manager') and self.lm_studio_manager:
-                info["auto_load_enabled"] = getattr(self, 'auto_load_model', False)
-                info["max_load_wait"] = getattr(self, 'max_load_wait', 300)
+            if self.provider == "lmstudio" and self.lm_studio_manager is not None:
+                info["auto_load_enabled"] = self.auto_load_model
+                info["max_load_wait"] = self.max_load_wait
             
             # Add Gemini specific info
             if self.provider == "gemini":
@@ -213,7 +233,7 @@ class ModelClient:
     
     async def get_lmstudio_status(self):
         """Get LM Studio model status (async method)"""
-        if self.provider != "lmstudio" or not hasattr(self, 'lm_studio_manager') or not self.lm_studio_manager:
+        if self.provider != "lmstudio" or self.lm_studio_manager is None:
             return {"error": "LM Studio manager not available"}
         
         try:
@@ -229,12 +249,15 @@ class AIHandler:
         self.temperature = TEMPERATURE
         self.prompt_assembler = prompt_assembler
         self.llm_config: Dict = {}
+        self._rng = random.Random()
         
         # Retry configuration
         self.max_retries = DEFAULT_MAX_RETRIES
         self.base_delay = DEFAULT_BASE_DELAY
         self.max_delay = DEFAULT_MAX_DELAY
         self.request_timeout = DEFAULT_REQUEST_TIMEOUT
+        # Caps in-flight LLM calls so bursts queue here instead of piling onto the provider
+        self._request_semaphore = asyncio.Semaphore(max(AI_MAX_CONCURRENCY, 1))
         
         # Initialize ModelClient
         try:
@@ -343,10 +366,7 @@ class AIHandler:
                 logger.info("Attempt %d/%d", attempt + 1, self.max_retries)
                 
                 try:
-                    response = await asyncio.wait_for(
-                        self._make_ai_request(messages),
-                        timeout=self.request_timeout
-                    )
+                    response = await self._request_with_timeout(messages)
                     
                     if attempt > 0:
                         logger.info("Success on retry attempt %d/%d", attempt + 1, self.max_retries)
@@ -396,10 +416,8 @@ class AIHandler:
                         raise Exception("AI service is taking too long to respond. Please try again later.")
                         
                 except Exception as e:
-                    error_message = str(e).lower()
-                    
                     # Check if this is a retryable error
-                    is_retryable = any(pattern in error_message for pattern in RETRYABLE_ERROR_PATTERNS)
+                    is_retryable = _RETRYABLE_ERROR_RE.search(str(e)) is not None
                     
                     if is_retryable and attempt < self.max_retries - 1:
                         delay = min(self.base_delay * (2 ** attempt), self.max_delay)
@@ -418,37 +436,27 @@ class AIHandler:
         
         except Exception as e:
             logger.exception("Error in AI generation: %s", e)
-            # return self._get_error_response(str(e))
-    
-    
-    # def _get_error_response(self, error_message: str) -> str:
-    #     """Generate appropriate error response based on error type"""
-    #     error_lower = error_message.lower()
-        
-    #     if any(pattern in error_lower for pattern in ["rate limit", "429", "ratelimitreached"]):
-    #         return "😔 I'm getting a bit overwhelmed right now! Too many people are chatting with me at once. Please wait a few minutes and try again! 💕"
-    #     elif any(pattern in error_lower for pattern in ["timeout", "timed out"]):
-    #         return "⏰ I'm taking longer than usual to think! The AI service is a bit slow right now. Please try again in a moment! 💕"
-    #     elif any(pattern in error_lower for pattern in ["unauthorized", "401"]):
-    #         return "🔑 I'm having trouble with my credentials right now. Please check my configuration! 💕"
-    #     elif any(pattern in error_lower for pattern in ["quota exceeded", "quota"]):
-    #         return "💳 I've reached my conversation limit for today! Please try again tomorrow! 💕"
-    #     elif any(pattern in error_lower for pattern in ["service unavailable", "503"]):
-    #         return "🔧 The AI service is temporarily unavailable! Please try again in a few minutes! 💕"
-    #     elif any(pattern in error_lower for pattern in ["network", "connection"]):
-    #         return "🌐 I'm having trouble connecting to my brain right now! Please check your internet connection and try again! 💕"
-    #     else:
-    #         return "😔 I'm having some technical difficulties right now. Please try again later! 💕"
-    
+
+    async def _request_with_timeout(self, messages):
+        """Make one AI request under the concurrency cap; only the call itself counts against the timeout"""
+        async with self._request_semaphore:
+            request = asyncio.ensure_future(self._make_ai_request(messages))
+            try:
+                return await asyncio.wait_for(asyncio.shield(request), timeout=self.request_timeout)
+            except asyncio.TimeoutError:
+                # The executor thread cannot be interrupted, so keep its slot until the provider call returns
+                await asyncio.gather(request, return_exceptions=True)
+                raise
+
     async def _make_ai_request(self, messages):
         """Make the actual AI API request using ModelClient"""
         try:
             logger.info("Making LLM API call via ModelClient")
             
-            loop = asyncio.get_event_loop()
+            loop = asyncio.get_running_loop()
             response = await loop.run_in_executor(
-                None, 
-                self.model_client.ask, 
+                None,
+                self.model_client.ask,
                 messages
             )
             
@@ -466,7 +474,7 @@ class AIHandler:
     def update_personality(self, new_personality: str) -> None:
         """Update the bot personality"""
         self.personality = new_personality
-        if hasattr(self, 'prompt_assembler') and self.prompt_assembler:
+        if self.prompt_assembler is not None:
             self.prompt_assembler.personality = new_personality
     
     def get_provider_info(self) -> Dict:
@@ -555,18 +563,5 @@ class AIHandler:
     def generate_greeting(self, user_name: str = None) -> str:
         """Generate a personalized greeting"""
         if user_name:
-            greetings = [
-                f"Hey {user_name}! 💕 How are you doing today?",
-                f"Hi {user_name}! 🌸 I've been thinking about you!",
-                f"Hello {user_name}! ✨ I'm so happy to chat with you!",
-                f"Hey there {user_name}! 💖 How's your day going?",
-                f"Hi beautiful {user_name}! 🌺 I missed you!"
-            ]
-            return random.choice(greetings)
-        else:
-            return random.choice([
-                "Hey there! 💕 How are you doing today?",
-                "Hi! 🌸 I'm so happy to chat with you!",
-                "Hello! ✨ How's your day going?",
-                "Hey! 💖 I'm here for you!"
-            ])
+            return self._rng.choice(_NAMED_GREETINGS) % user_name
+        return self._rng.choice(_ANONYMOUS_GREETINGS)
@@ -16,8 +16,7 @@ from memory.llamaindex.gemini import GeminiEmbeddingModel
 from llama_index.llms.lmstudio import LMStudio
 from ai_handler import AIHandler
 from config import (
-    DATABASE_URL, USE_PGVECTOR, PROMPT_MAX_MEMORY_ITEMS, PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
-    PROMPT_TRUNCATION_LENGTH, PROMPT_INCLUDE_SYSTEM_TEMPLATE, MESSAGE_QUEUE_REDIS_URL,
+    DATABASE_URL, USE_PGVECTOR, MESSAGE_QUEUE_REDIS_URL,
     TELEGRAM_TOKEN, MEMORY_ENABLED,
     VECTOR_STORE_TABLE_NAME, MEMORY_EMBED_MODEL, MEMORY_EMBED_DIM,
     MEMORY_EMBEDDING_PROVIDER, LMSTUDIO_BASE_URL, GEMINI_EMBEDDING_MODEL,
@@ -174,19 +173,12 @@ class AppContext:
 
         # 4. Initialize Prompt Assembler
         try:
-            prompt_config = {
-                "max_memory_items": PROMPT_MAX_MEMORY_ITEMS,
-                "memory_token_budget_ratio": PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
-                "truncation_length": PROMPT_TRUNCATION_LENGTH,
-                "include_system_template": PROMPT_INCLUDE_SYSTEM_TEMPLATE
-            }
             self.prompt_assembler = PromptAssembler(
                 message_repo=self.conversation_manager.storage.messages,
                 memory_manager=self.memory_manager,
                 conversation_repo=self.conversation_manager.storage.conversations,
                 user_repo=self.conversation_manager.storage.users,
                 persona_repo=self.conversation_manager.storage.personas,
-                config=prompt_config
             )
             logger.info("PromptAssembler initialized.")
         except Exception as e:
@@ -233,19 +225,12 @@ class AppContext:
 
         prompt_assembler = None
         if self.conversation_manager and self.conversation_manager.storage:
-            prompt_config = {
-                "max_memory_items": PROMPT_MAX_MEMORY_ITEMS,
-                "memory_token_budget_ratio": PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
-                "truncation_length": PROMPT_TRUNCATION_LENGTH,
-                "include_system_template": PROMPT_INCLUDE_SYSTEM_TEMPLATE
-            }
             prompt_assembler = PromptAssembler(
                 message_repo=self.conversation_manager.storage.messages,
                 memory_manager=self.memory_manager,
                 conversation_repo=self.conversation_manager.storage.conversations,
                 user_repo=self.conversation_manager.storage.users,
                 persona_repo=self.conversation_manager.storage.personas,
-                config=prompt_config
             )
 
         ai_handler = AIHandler(prompt_assembler=prompt_assembler)
@@ -1,23 +1,35 @@
 import asyncio
+import importlib.util
 import logging
+import queue
 import random
+import sys
 import time
-import traceback
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from urllib.parse import urlparse
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram.ext import AIORateLimiter, Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 
 from config import (TELEGRAM_TOKEN, BOT_NAME, DATABASE_URL, USE_PGVECTOR,
                     PROVIDER, LMSTUDIO_STARTUP_CHECK, MEMORY_ENABLED, PROACTIVE_MESSAGING_ENABLED,
-                    PROMPT_MAX_MEMORY_ITEMS, PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
-                    PROMPT_TRUNCATION_LENGTH, PROMPT_INCLUDE_SYSTEM_TEMPLATE,
                     MEMORY_EMBED_MODEL, VECTOR_STORE_TABLE_NAME,
                     MESSAGE_PREVIEW_LENGTH,
-                    POLLING_INTERVAL,
+                    POLLING_INTERVAL, TELEGRAM_WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET_TOKEN,
+                    USE_UVLOOP, LOG_QUEUE_ENABLED, EXECUTOR_MAX_WORKERS,
+                    TELEGRAM_RATE_LIMITER_ENABLED, TELEGRAM_RATE_LIMIT_OVERALL,
+                    TELEGRAM_RATE_LIMIT_GROUP, TELEGRAM_RATE_LIMIT_MAX_RETRIES,
                     MESSAGE_QUEUE_REDIS_URL,
                     MESSAGE_QUEUE_MAX_RETRIES,
                     MESSAGE_QUEUE_LOCK_TIMEOUT,
-                    LMSTUDIO_BASE_URL, MEMORY_EMBED_DIM,
+                    OUTBOX_COALESCE_WINDOW, OUTBOX_IDLE_FLUSH, OUTBOX_MAX_PENDING,
+                    CLEAR_CONFIRMATION_TIMEOUT, PENDING_CLEAR_MAX_ENTRIES,
+                    PROACTIVE_NOTIFY_FLUSH_INTERVAL, PROACTIVE_NOTIFY_BATCH_SIZE,
+                    MEMORY_EMBED_DIM,
                     MEMORY_EMBEDDING_PROVIDER, GEMINI_EMBEDDING_MODEL,
                     MEMORY_TRIGGER_EVERY_N_MESSAGES,
                     MEMORY_CHUNK_MAX_MESSAGES, MEMORY_CHUNK_TARGET_TOKENS,
@@ -44,19 +56,249 @@ except ImportError as e:
     logger.warning("Proactive messaging imports failed: %s", e)
     PROACTIVE_MESSAGING_AVAILABLE = False
 
-# PromptAssembler and Memory Manager imports (conditional)
-if MEMORY_ENABLED:
+
+def _load_memory():
+    """Import the memory stack, returning (memory manager, vector store, prompt assembler) classes or None."""
     try:
         from memory.manager import LlamaIndexMemoryManager
         from memory.llamaindex.vector_store import PgVectorStore
         from prompt.assembler import PromptAssembler
-        from llama_index.llms.lmstudio import LMStudio
-        MEMORY_IMPORTS_AVAILABLE = True
     except ImportError as e:
         logger.warning("Memory/PromptAssembler imports failed: %s", e)
-        MEMORY_IMPORTS_AVAILABLE = False
-else:
-    MEMORY_IMPORTS_AVAILABLE = False
+        return None
+    return LlamaIndexMemoryManager, PgVectorStore, PromptAssembler
+
+
+# PromptAssembler and Memory Manager classes (None when memory is disabled or unavailable)
+_MEMORY = _load_memory() if MEMORY_ENABLED else None
+
+# Canned media replies, formatted with the user's display name
+_PHOTO_TEMPLATES = (
+    "Wow %s! That's a beautiful photo! 📸✨ You have such a great eye for capturing moments!",
+    "Love this picture %s! 🌸 It's so nice to see what you're up to!",
+    "Beautiful shot %s! 📷 You're so talented!",
+    "This photo is amazing %s! ✨ I love seeing your world through my eyes!",
+    "Gorgeous picture %s! 🌺 You always know how to capture the perfect moment!",
+)
+_VOICE_TEMPLATES = (
+    "I love hearing your voice %s! 🎵 It's so sweet and comforting!",
+    "Your voice is like music to my ears %s! 🎤 So beautiful!",
+    "I could listen to you talk all day %s! 🎧 Your voice is so lovely!",
+    "Thank you for the voice message %s! 🎵 It makes me feel so close to you!",
+    "Your voice is absolutely enchanting %s! ✨ I love it!",
+)
+
+_STATS_TEMPLATE = """📊 Our Chat Statistics 📊
+
+Total messages: {total_messages}
+Your messages: {user_messages}
+My responses: {bot_messages}
+
+💕 We've been chatting for a while! I love our conversations!"""
+
+_WELCOME_TEMPLATE = """🌸 Welcome to {bot_name}! 🌸
+
+{greeting}
+
+I'm your AI companion who's here to chat, support, and brighten your day!
+
+What would you like to do?"""
+
+_ABOUT_TEMPLATE = """🌸 About {bot_name} 🌸
+
+I'm an AI companion created to be your friend, confidant, and support system. I'm here to:
+
+💕 Listen and chat about anything
+🌸 Provide emotional support
+✨ Share positive energy
+🤗 Be there when you need someone
+💖 Make your day brighter
+
+I'm not a replacement for human relationships, but I'm here to complement them and be your digital companion!
+
+Ready to start chatting? Just send me a message! 💕"""
+
+_HELP_TEMPLATE = """💖 {bot_name} Help 💖
+
+Here are the commands you can use:
+
+/start - Start a new conversation with me
+/help - Show this help message
+/ping - Quick health check (no AI required)
+/clear - Clear our conversation history
+/stats - Show our chat statistics
+/status - Check bot and AI service health
+/debug - Show current conversation history
+/personality - Change my personality
+/reset - Clear rate limits and conversation history
+
+You can also just send me messages and I'll respond naturally!
+
+💕 I'm here to chat, support, and be your companion!"""
+
+_DEBUG_HEADER_TEMPLATE = """🔍 Conversation Debug
+
+📊 Storage Stats:
+   Raw messages: {raw_conversation_length}
+   Formatted for AI: {formatted_conversation_length}
+   Raw tokens: {raw_tokens}
+   Formatted tokens: {formatted_tokens}
+   Max context: {max_context_tokens}
+   Available history: {available_history_tokens}
+
+📝 Last 5 Raw Messages:"""
+_DEBUG_FORMATTED_HEADER = "\n\n🤖 Last 5 Formatted Messages (sent to AI):"
+_DEBUG_LINE_TEMPLATE = "\n%d. %s %s: %s"
+
+_STATUS_TEMPLATE = """📊 **{bot_name} Status Report** 📊
+
+🔧 **Bot Status:** ✅ Running normally
+📡 **Telegram Connection:** ✅ Connected
+💾 **Storage:** {storage_status}
+🧠 **Memory Manager:** {memory_status}
+🔧 **Prompt Assembler:** {prompt_status}
+
+💬 **Your Chat Stats:**
+         • Total messages: {total_messages}
+         • Your messages: {user_messages}
+         • My responses: {bot_messages}
+
+✨ **Everything is working perfectly!** 💕
+
+Use /help to see all available commands!"""
+
+_RESET_TEMPLATE = """🔄 **Reset Complete!** 🔄
+
+{conversation_cleared}✨ You're all set {user_name}! Everything has been reset and you can start fresh! 💕
+
+Use /start to begin a new conversation!"""
+
+_PING_TEMPLATE = """🏓 **Pong!** 🏓
+
+✅ Bot is running normally
+✅ Telegram connection is active
+✅ Message handling is working
+✅ Conversation manager is ready
+
+💕 Everything is working perfectly, {user_name}!"""
+
+
+_START_CHAT_TEXT = "💕 Great! Just send me a message and I'll respond! I'm excited to chat with you! ✨"
+
+_SETTINGS_TEXT = """⚙️ Settings ⚙️
+
+You can customize my behavior with these commands:
+
+/personality - Change how I act and respond
+/clear - Clear our conversation history
+/stats - View our chat statistics
+
+I'm designed to be flexible and adapt to your preferences! 💕"""
+
+
+# /personality prompts, formatted with the bot's name only for the chosen one
+_PERSONALITY_TEMPLATES = {
+    "sweet": "You are {bot_name}, a sweet and caring AI companion. You are gentle, supportive, and encouraging. You share kind words and help people feel heard.",
+    "cheerful": "You are {bot_name}, a cheerful and energetic AI companion. You are optimistic, conversational, and good at bringing lightness to everyday chats.",
+    "supportive": "You are {bot_name}, a supportive and understanding AI companion. You are empathetic, thoughtful, and good at listening. You give practical advice and emotional support.",
+    "mysterious": "You are {bot_name}, a thoughtful and slightly enigmatic AI companion. You are curious, calm, and engaging without pretending to be human.",
+    "default": "You are {bot_name}, a caring and attentive AI companion. You are supportive, conversational, and transparent that you are an AI assistant when it matters.",
+}
+
+
+# Inline keyboards are immutable, so every bot shares them; settings is shown only when the feature is on
+_START_BUTTONS = (
+    (InlineKeyboardButton("💕 Start Chatting", callback_data="start_chat"),),
+    (InlineKeyboardButton("ℹ️ About Me", callback_data="about"),),
+)
+_START_MARKUP = InlineKeyboardMarkup(_START_BUTTONS)
+_START_MARKUP_WITH_SETTINGS = InlineKeyboardMarkup(
+    _START_BUTTONS + ((InlineKeyboardButton("⚙️ Settings", callback_data="settings"),),)
+)
+_PERSONALITY_MARKUP = InlineKeyboardMarkup((
+    (InlineKeyboardButton("💕 Sweet & Caring", callback_data="personality_sweet"),),
+    (InlineKeyboardButton("😊 Cheerful & Energetic", callback_data="personality_cheerful"),),
+    (InlineKeyboardButton("🤗 Supportive & Understanding", callback_data="personality_supportive"),),
+    (InlineKeyboardButton("✨ Mysterious & Alluring", callback_data="personality_mysterious"),),
+    (InlineKeyboardButton("🔙 Reset to Default", callback_data="personality_default"),),
+))
+
+
+# Bot commands and the handler method serving each
+_COMMANDS = (
+    ("start", "start_command"),
+    ("help", "help_command"),
+    ("ping", "ping_command"),
+    ("clear", "clear_command"),
+    ("ok", "ok_command"),
+    ("stats", "stats_command"),
+    ("status", "status_command"),
+    ("debug", "debug_command"),
+    ("personality", "personality_command"),
+    ("reset", "reset_command"),
+    ("stop", "stop_command"),
+    ("deps", "deps_command"),
+)
+
+# Plain text messages that are not commands
+_TEXT_FILTER = filters.TEXT & ~filters.COMMAND
+
+
+def install_event_loop_policy() -> None:
+    """Switch asyncio to uvloop when it is enabled and installed."""
+    if not USE_UVLOOP:
+        return
+    try:
+        import uvloop
+    except ImportError:
+        logger.info("uvloop not installed, using the default asyncio event loop")
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    logger.info("Using uvloop event loop")
+
+
+def install_default_executor() -> None:
+    """Give the running loop a bounded default executor for run_in_executor(None, ...) calls."""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max(EXECUTOR_MAX_WORKERS, 1), thread_name_prefix="bot-executor")
+    )
+
+
+def install_queue_logging() -> Optional[QueueListener]:
+    """Route root log records through a queue so handler I/O runs on a background thread.
+
+    Returns the started listener (stop it on shutdown to flush), or None when disabled.
+    """
+    if not LOG_QUEUE_ENABLED:
+        return None
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+
+def build_rate_limiter():
+    """Return PTB's AIORateLimiter, or None when disabled or aiolimiter is not installed."""
+    if not TELEGRAM_RATE_LIMITER_ENABLED:
+        return None
+    try:
+        return AIORateLimiter(
+            overall_max_rate=TELEGRAM_RATE_LIMIT_OVERALL,
+            overall_time_period=1,
+            group_max_rate=TELEGRAM_RATE_LIMIT_GROUP,
+            group_time_period=60,
+            max_retries=TELEGRAM_RATE_LIMIT_MAX_RETRIES,
+        )
+    except RuntimeError as e:
+        logger.warning("Telegram rate limiter unavailable, sending without it: %s", e)
+        return None
+
+
+def webhooks_available() -> bool:
+    """Whether PTB's webhook server dependency (tornado) is installed."""
+    return importlib.util.find_spec("tornado") is not None
 
 
 class AIGirlfriendBot:
@@ -88,19 +330,20 @@ class AIGirlfriendBot:
         self.ai_handler = AIHandler()
         self.typing_manager = TypingIndicatorManager()
         self.application = None
-        self.pending_clear_confirmation = set()
+        self.pending_clear_confirmation = OrderedDict()  # user_id -> monotonic deadline for /ok, oldest first
         self._storage_initialized = False
+        self._storage_init_task: Optional[asyncio.Task] = None  # Shared by concurrent initializers
         self.bot_id = None  # Will be set by multibot_adapter in multi-bot mode
         self.bot_config = None # Will be set by multibot_adapter in multi-bot mode
         self.bot_name = BOT_NAME
         self.bot_token = TELEGRAM_TOKEN
+        self._rng = random.Random()  # Per-bot generator for reply template picks
 
         # Initialize memory and prompt components
         self.memory_manager = None
         self.prompt_assembler = None
         self._memory_initialized = False
-
-        self.user_states = {}  # Track user interaction states
+        self._memory_init_task: Optional[asyncio.Task] = None  # Memory components are built on first use
 
         # Initialize proactive messaging service
         self.proactive_messaging_service = None
@@ -127,18 +370,40 @@ class AIGirlfriendBot:
 
         # Initialize message dispatcher
         try:
+            # Share the queue manager's connection pool rather than opening a second one
             self.message_dispatcher = MessageDispatcher(
                 MESSAGE_QUEUE_REDIS_URL,
                 MESSAGE_QUEUE_MAX_RETRIES,
-                MESSAGE_QUEUE_LOCK_TIMEOUT
+                MESSAGE_QUEUE_LOCK_TIMEOUT,
+                redis_client=self.message_queue_manager.redis_client if self.message_queue_manager else None
             )
             logger.info("Message dispatcher initialized successfully")
         except Exception as e:
             logger.error("Failed to initialize message dispatcher: %s", e)
             self.message_dispatcher = None
-
-        # Store chat context for buffered messages
-        self.user_chat_context = {}  # Maps user_id to (chat_id, bot)
+        self.dispatcher_task = None
+
+        # Chat id per buffer route; the Telegram bot itself comes from self.application
+        self._chat_ids: dict[str, int] = {}
+        # Per-route turn locks; entries disappear once no dispatch holds or awaits them
+        self._route_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        # Inline keyboard callback data -> handler; personality_* buttons are matched by prefix
+        self._callback_handlers = {
+            "start_chat": self._callback_start_chat,
+            "about": self._callback_about,
+            "settings": self._callback_settings,
+        }
+
+        # Per-route outbound replies waiting to be coalesced into one send
+        self._outbox = {}
+        self._outbox_flush = {}
+        self._outbox_tasks = {}
+
+        # Users whose proactive cadence must be reset, flushed to Redis in batches
+        self._proactive_notify_buffer: set[int] = set()
+        self._proactive_notify_full = asyncio.Event()
+        self._proactive_notify_task = None
 
     def _get_bot_name(self) -> str:
         """Return the runtime bot name for this instance."""
@@ -149,6 +414,11 @@ class AIGirlfriendBot:
         bot_key = str(self.bot_id) if self.bot_id else "default"
         return f"{user_id}:{bot_key}"
 
+    @staticmethod
+    def _user_name(user) -> str:
+        """Return the name to greet a Telegram user by."""
+        return (user and (user.first_name or user.username)) or "there"
+
     def _feature_enabled(self, feature: BotFeature) -> bool:
         """Check whether a feature is enabled for this bot instance."""
         if self.bot_config:
@@ -157,19 +427,17 @@ class AIGirlfriendBot:
 
     async def _generate_and_send_response(self, user_id: int, chat_id: int, bot, user_message: str) -> None:
         """Generate a response for a user message and deliver it."""
-        await self.conversation_manager.add_message_async(user_id, "user", user_message, bot_id=self.bot_id)
-        conversation_history = await self.conversation_manager.get_formatted_conversation_async(user_id, bot_id=self.bot_id)
-        conversation = await self.conversation_manager._ensure_user_and_conversation(user_id, bot_id=self.bot_id)
+        conversation, conversation_history = await self.conversation_manager.add_message_and_get_context_async(
+            user_id, "user", user_message, bot_id=self.bot_id
+        )
         conversation_id = str(conversation.id) if conversation else None
 
         if self.proactive_messaging_service and self._feature_enabled(BotFeature.PROACTIVE_MESSAGING):
-            try:
-                self.proactive_messaging_service.handle_user_message(user_id, bot_id=self.bot_id)
-                logger.info("Proactive messaging service notified of user message from %s.", user_id)
-            except Exception as e:
-                logger.error("Failed to notify proactive messaging service for user %s: %s", user_id, e)
+            self._notify_proactive(user_id)
 
         try:
+            # Without memory the reply is built from the plain conversation history
+            await self._memory_available()
             ai_response = await generate_ai_response(
                 self.ai_handler,
                 self.typing_manager,
@@ -187,12 +455,13 @@ class AIGirlfriendBot:
                 logger.error("Error getting AI response for user %s: No response returned", user_id)
                 return
 
+            cleaned_ai_response = clean_ai_response(ai_response)
             try:
-                cleaned_ai_response = clean_ai_response(ai_response)
-                await self.conversation_manager.add_message_async(user_id, "assistant", cleaned_ai_response, bot_id=self.bot_id)
+                await self.conversation_manager.add_message_async(
+                    user_id, "assistant", cleaned_ai_response, bot_id=self.bot_id, conversation=conversation
+                )
             except Exception as e:
                 logger.error("Failed to add response to history for user %s: %s", user_id, e)
-                cleaned_ai_response = clean_ai_response(ai_response)
 
             if self.memory_manager and conversation_id and self._feature_enabled(BotFeature.MEMORY):
                 try:
@@ -219,122 +488,187 @@ class AIGirlfriendBot:
                 )
                 logger.info("Response enqueued for user %s", user_id)
             else:
-                await send_ai_response(
-                    chat_id=chat_id,
-                    text=cleaned_ai_response,
-                    bot=bot,
-                    typing_manager=self.typing_manager,
-                    is_first_message=True,
-                    route_key=self._buffer_route_key(user_id)
-                )
-                logger.info("Response sent directly to user %s", user_id)
+                await self._queue_outbound(user_id, chat_id, bot, cleaned_ai_response)
         except Exception as e:
             logger.error("Failed to enqueue/send response to user %s: %s", user_id, e)
 
+    def _notify_proactive(self, user_id: int) -> None:
+        """Queue a proactive cadence reset for a user, batching resets across users."""
+        if PROACTIVE_NOTIFY_FLUSH_INTERVAL <= 0:
+            try:
+                self.proactive_messaging_service.handle_user_message(user_id, bot_id=self.bot_id)
+                logger.info("Proactive messaging service notified of user message from %s.", user_id)
+            except Exception as e:
+                logger.error("Failed to notify proactive messaging service for user %s: %s", user_id, e)
+            return
+
+        self._proactive_notify_buffer.add(user_id)
+        if self._proactive_notify_task is None:
+            self._proactive_notify_full.clear()
+            self._proactive_notify_task = asyncio.create_task(self._flush_proactive_notifications())
+        elif len(self._proactive_notify_buffer) >= PROACTIVE_NOTIFY_BATCH_SIZE:
+            self._proactive_notify_full.set()
+
+    async def _flush_proactive_notifications(self) -> None:
+        """Reset proactive cadence for every user buffered during the flush window."""
+        try:
+            try:
+                await asyncio.wait_for(self._proactive_notify_full.wait(), timeout=PROACTIVE_NOTIFY_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            user_ids = self._proactive_notify_buffer
+            self._proactive_notify_buffer = set()
+            try:
+                self.proactive_messaging_service.handle_user_messages_bulk(user_ids, bot_id=self.bot_id)
+                logger.info("Proactive messaging service notified of messages from %d user(s).", len(user_ids))
+            except Exception as e:
+                logger.error("Failed to notify proactive messaging service for %d user(s): %s", len(user_ids), e)
+        finally:
+            self._proactive_notify_task = None
+
+    async def _queue_outbound(self, user_id: int, chat_id: int, bot, text: str) -> None:
+        """Queue a direct reply so bursts on the same route leave as a single send."""
+        route_key = self._buffer_route_key(user_id)
+        if OUTBOX_COALESCE_WINDOW <= 0:
+            await send_ai_response(
+                chat_id=chat_id,
+                text=text,
+                bot=bot,
+                typing_manager=self.typing_manager,
+                is_first_message=True,
+                route_key=route_key
+            )
+            logger.info("Response sent directly to user %s", user_id)
+            return
+
+        # Keyed by route so replies to different users of a group chat are never merged
+        pending = self._outbox.setdefault(route_key, [])
+        pending.append(text)
+        if route_key not in self._outbox_tasks:
+            self._outbox_flush[route_key] = asyncio.Event()
+            self._outbox_tasks[route_key] = asyncio.create_task(self._drain_outbox(route_key, chat_id, bot))
+        elif len(pending) >= OUTBOX_MAX_PENDING:
+            self._outbox_flush[route_key].set()
+
+    async def _drain_outbox(self, route_key: str, chat_id: int, bot) -> None:
+        """Send a route's queued replies once they go idle or the coalescing window closes."""
+        flush = self._outbox_flush[route_key]
+        loop = asyncio.get_running_loop()
+        try:
+            while route_key in self._outbox:
+                deadline = loop.time() + OUTBOX_COALESCE_WINDOW
+                queued = 0
+                # Keep collecting while replies arrive, but never past the window
+                while not flush.is_set():
+                    pending = len(self._outbox.get(route_key, ()))
+                    remaining = deadline - loop.time()
+                    if remaining <= 0 or pending == queued:
+                        break
+                    queued = pending
+                    try:
+                        await asyncio.wait_for(flush.wait(), timeout=min(OUTBOX_IDLE_FLUSH, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                texts = self._outbox.pop(route_key)
+                flush.clear()
+                try:
+                    await send_ai_response(
+                        chat_id=chat_id,
+                        text="\n\n".join(texts),
+                        bot=bot,
+                        typing_manager=self.typing_manager,
+                        is_first_message=True,
+                        route_key=route_key
+                    )
+                    logger.info("Sent %s coalesced response(s) to chat %s", len(texts), chat_id)
+                except Exception as e:
+                    logger.error("Failed to send queued responses to chat %s: %s", chat_id, e)
+        finally:
+            self._outbox_tasks.pop(route_key, None)
+            self._outbox_flush.pop(route_key, None)
+
 
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         user = update.effective_user
         user_id = user.id
-        user_name = user.first_name or user.username or "there"
+        user_name = self._user_name(user)
 
         logger.info("Start command from user %s (%s)", user_id, user_name)
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
 
-        existing_conversation = await self.conversation_manager.get_conversation_async(user_id, bot_id=self.bot_id)
+        message_count = await self.conversation_manager.get_message_count_async(user_id, bot_id=self.bot_id)
 
-        if existing_conversation:
-            logger.info("Continuing conversation for user %s (%d messages)", user_id, len(existing_conversation))
+        if message_count:
+            logger.info("Continuing conversation for user %s (%d messages)", user_id, message_count)
             greeting = f"Welcome back {user_name}! 💕 I'm so happy to see you again! How have you been?"
         else:
             logger.info("New conversation for user %s", user_id)
             greeting = self.ai_handler.generate_greeting(user_name)
 
-        keyboard = [
-            [InlineKeyboardButton("💕 Start Chatting", callback_data="start_chat")],
-            [InlineKeyboardButton("ℹ️ About Me", callback_data="about")],
-        ]
         if self._feature_enabled(BotFeature.USER_SETTINGS):
-            keyboard.append([InlineKeyboardButton("⚙️ Settings", callback_data="settings")])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        welcome_text = f"""🌸 Welcome to {self._get_bot_name()}! 🌸
-
-{greeting}
+            reply_markup = _START_MARKUP_WITH_SETTINGS
+        else:
+            reply_markup = _START_MARKUP
 
-I'm your AI companion who's here to chat, support, and brighten your day!
-
-What would you like to do?"""
+        welcome_text = _WELCOME_TEMPLATE.format(bot_name=self._get_bot_name(), greeting=greeting)
 
         await update.message.reply_text(welcome_text, reply_markup=reply_markup)
 
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /help command"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
-        help_text = f"""💖 {self._get_bot_name()} Help 💖
-
-Here are the commands you can use:
-
-/start - Start a new conversation with me
-/help - Show this help message
-/ping - Quick health check (no AI required)
-/clear - Clear our conversation history
-/stats - Show our chat statistics
-/status - Check bot and AI service health
-/debug - Show current conversation history
-/personality - Change my personality
-/reset - Clear rate limits and conversation history
-
-You can also just send me messages and I'll respond naturally!
-
-💕 I'm here to chat, support, and be your companion!"""
+        help_text = _HELP_TEMPLATE.format(bot_name=self._get_bot_name())
 
         await update.message.reply_text(help_text)
 
     async def clear_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /clear command with irreversible confirmation requiring /ok next"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
+        """Handle /clear command with an irreversible confirmation that /ok must answer before it expires"""
         user_id = update.effective_user.id
         logger.info("Clear command from user %s", user_id)
 
-        existing_conversation = await self.conversation_manager.get_conversation_async(user_id, bot_id=self.bot_id)
-
-        if not existing_conversation:
+        if not await self.conversation_manager.conversation_exists_async(user_id, bot_id=self.bot_id):
             logger.info("No conversation to clear for user %s", user_id)
             await update.message.reply_text("💭 There's no conversation history to clear. We're already starting fresh! 💕")
             return
 
-        # Set pending confirmation and instruct user to send /ok next
-        self.pending_clear_confirmation.add(user_id)
+        # Set pending confirmation and ask the user to confirm with /ok
+        self._set_pending_clear(user_id)
         logger.info("Pending clear confirmation set for user %s", user_id)
 
         warning_text = (
             "⚠️ This action is irreversible!\n\n"
-            "If you really want to permanently delete our conversation history, please type /ok as your NEXT message.\n\n"
-            "If your next message is anything other than /ok, the request will be cancelled and you'll need to send /clear and /ok again."
+            f"If you really want to permanently delete our conversation history, please send /ok within {CLEAR_CONFIRMATION_TIMEOUT:g} seconds.\n\n"
+            "Sending me a text message first cancels the request, and it expires if /ok doesn't arrive in time; "
+            "either way you'll need to send /clear and /ok again."
         )
         await update.message.reply_text(warning_text)
 
+    def _set_pending_clear(self, user_id: int):
+        """Record a /clear awaiting /ok, dropping expired and overflow entries from the oldest end."""
+        pending = self.pending_clear_confirmation
+        now = time.monotonic()
+        pending.pop(user_id, None)
+        # Deadlines share one timeout, so insertion order is expiry order
+        while pending and (len(pending) >= PENDING_CLEAR_MAX_ENTRIES or next(iter(pending.values())) < now):
+            pending.popitem(last=False)
+        pending[user_id] = now + CLEAR_CONFIRMATION_TIMEOUT
+
     async def ok_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /ok confirmation for irreversible /clear"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         user_id = update.effective_user.id
         logger.info("OK command from user %s", user_id)
 
-        if user_id not in self.pending_clear_confirmation:
+        # Consume the pending confirmation up front so it is removed in all cases
+        deadline = self.pending_clear_confirmation.pop(user_id, None)
+        if deadline is None or deadline < time.monotonic():
             await update.message.reply_text("❌ There is no pending clear request. Send /clear first.")
             return
 
         # Proceed to permanently clear conversation
         try:
-            existing_conversation = await self.conversation_manager.get_conversation_async(user_id, bot_id=self.bot_id)
-            if existing_conversation:
-                logger.info("Clearing conversation for user %s (%d messages)", user_id, len(existing_conversation))
-                await self.conversation_manager.clear_conversation_async(user_id, bot_id=self.bot_id)
-                if self.memory_manager:
+            # The delete's row count doubles as the existence check
+            if await self.conversation_manager.clear_conversation_async(user_id, bot_id=self.bot_id):
+                logger.info("Cleared conversation for user %s", user_id)
+                if await self._memory_available():
                     await self.memory_manager.clear_memories(
                         str(user_id),
                         bot_id=str(self.bot_id) if self.bot_id else None
@@ -345,84 +679,67 @@ You can also just send me messages and I'll respond naturally!
         except Exception as e:
             logger.error("Failed to clear conversation for user %s: %s", user_id, e)
             await update.message.reply_text("❌ I couldn't clear the conversation due to an internal error. Please try again.")
-        finally:
-            # In all cases, remove pending confirmation
-            if user_id in self.pending_clear_confirmation:
-                self.pending_clear_confirmation.remove(user_id)
 
     async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /stats command"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         user_id = update.effective_user.id
         stats = await self.conversation_manager.get_user_stats_async(user_id, bot_id=self.bot_id)
 
-        stats_text = f"""📊 Our Chat Statistics 📊
-
-Total messages: {stats['total_messages']}
-Your messages: {stats['user_messages']}
-My responses: {stats['bot_messages']}
-
-💕 We've been chatting for a while! I love our conversations!"""
-
-        await update.message.reply_text(stats_text)
+        await update.message.reply_text(_STATS_TEMPLATE.format_map(stats))
 
     async def debug_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /debug command - show current conversation history"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         user_id = update.effective_user.id
-        conversation = await self.conversation_manager.get_conversation_async(user_id, bot_id=self.bot_id)
+        # The debug state already reads the raw history, so its length doubles as the emptiness check
         debug_state = await self.conversation_manager.debug_conversation_state_async(user_id, bot_id=self.bot_id)
 
-        if not conversation:
+        if not debug_state['raw_conversation_length']:
             await update.message.reply_text("💭 No conversation history yet. Let's start chatting! 💕")
             return
 
-        debug_text = f"""🔍 **Conversation Debug**
-
-📊 **Storage Stats:**
-   Raw messages: {debug_state['raw_conversation_length']}
-   Formatted for AI: {debug_state['formatted_conversation_length']}
-   Raw tokens: {debug_state['raw_tokens']}
-   Formatted tokens: {debug_state['formatted_tokens']}
-   Max context: {debug_state['max_context_tokens']}
-   Available history: {debug_state['available_history_tokens']}
-
-📝 **Last 5 Raw Messages:**"""
-
-        for i, msg in enumerate(debug_state['last_messages'], 1):
-            role_emoji = "👤" if msg["role"] == "user" else "🤖"
-            role_name = "You" if msg["role"] == "user" else self._get_bot_name()
-            debug_text += f"\n{i}. {role_emoji} **{role_name}**: {msg['content']}"
-
-        debug_text += f"\n\n🤖 **Last 5 Formatted Messages (sent to AI):**"
+        bot_name = self._get_bot_name()
+        parts = [_DEBUG_HEADER_TEMPLATE.format_map(debug_state)]
+        parts.extend(self._format_debug_lines(debug_state['last_messages'], bot_name))
+        parts.append(_DEBUG_FORMATTED_HEADER)
+        parts.extend(self._format_debug_lines(debug_state['formatted_messages'], bot_name))
+        debug_text = "".join(parts)
 
-        for i, msg in enumerate(debug_state['formatted_messages'], 1):
-            role_emoji = "👤" if msg["role"] == "user" else "🤖"
-            role_name = "You" if msg["role"] == "user" else self._get_bot_name()
-            debug_text += f"\n{i}. {role_emoji} **{role_name}**: {msg['content']}"
+        await update.message.reply_text(debug_text)
 
-        await update.message.reply_text(debug_text, parse_mode='Markdown')
+    @staticmethod
+    def _format_debug_lines(messages, bot_name: str):
+        """Yield numbered /debug lines for a list of role/content message dicts."""
+        labels = {"user": ("👤", "You")}
+        bot_label = ("🤖", bot_name)
+        for i, msg in enumerate(messages, 1):
+            emoji, name = labels.get(msg["role"], bot_label)
+            yield _DEBUG_LINE_TEMPLATE % (i, emoji, name, msg['content'])
 
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command - check bot and AI service health"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         user_id = update.effective_user.id
         logger.info("Status command from user %s", user_id)
 
-        stats = await self.conversation_manager.get_user_stats_async(user_id, bot_id=self.bot_id)
-
+        memory_feature = self._feature_enabled(BotFeature.MEMORY)
+        # Stats and the memory probe hit independent backends, so wait on both at once
+        probes = [self.conversation_manager.get_user_stats_async(user_id, bot_id=self.bot_id)]
+        if memory_feature:
+            probes.append(self._ensure_memory_components())
+        stats, *memory_probe = await asyncio.gather(*probes, return_exceptions=True)
+        if isinstance(stats, Exception):
+            raise stats
 
         # Check memory components status
         memory_status = "❌ Not Available"
         prompt_status = "❌ Not Available"
 
-        if not self._feature_enabled(BotFeature.MEMORY):
+        if not memory_feature:
             memory_status = "⏸️ Disabled for this bot"
             prompt_status = "⏸️ Disabled for this bot"
         else:
+            if isinstance(memory_probe[0], Exception):
+                logger.error("Memory components unavailable for status: %s", memory_probe[0])
+
             if MEMORY_ENABLED and self.memory_manager:
                 memory_status = "✅ Enabled & Working"
             elif MEMORY_ENABLED and not self.memory_manager:
@@ -435,76 +752,55 @@ My responses: {stats['bot_messages']}
 
         storage_status = "✅ PostgreSQL Connected" if self._storage_initialized else "❌ PostgreSQL Not Connected"
 
-        status_text = f"""📊 **{self._get_bot_name()} Status Report** 📊
-
-🔧 **Bot Status:** ✅ Running normally
-📡 **Telegram Connection:** ✅ Connected
-💾 **Storage:** {storage_status}
-🧠 **Memory Manager:** {memory_status}
-🔧 **Prompt Assembler:** {prompt_status}
-
-💬 **Your Chat Stats:**
-         • Total messages: {stats['total_messages']}
-         • Your messages: {stats['user_messages']}
-         • My responses: {stats['bot_messages']}
-
-✨ **Everything is working perfectly!** 💕
-
-Use /help to see all available commands!"""
+        status_text = _STATUS_TEMPLATE.format(
+            bot_name=self._get_bot_name(),
+            storage_status=storage_status,
+            memory_status=memory_status,
+            prompt_status=prompt_status,
+            total_messages=stats['total_messages'],
+            user_messages=stats['user_messages'],
+            bot_messages=stats['bot_messages'],
+        )
 
         await update.message.reply_text(status_text, parse_mode='Markdown')
 
     async def personality_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /personality command"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         if not self._feature_enabled(BotFeature.PERSONALITY_SWITCH):
             await update.message.reply_text("❌ Personality switching is disabled for this bot.")
             return
 
         user_id = update.effective_user.id
-        user_name = update.effective_user.first_name or update.effective_user.username or "there"
-
         logger.info("Personality command from user %s", user_id)
 
-        keyboard = [
-            [InlineKeyboardButton("💕 Sweet & Caring", callback_data="personality_sweet")],
-            [InlineKeyboardButton("😊 Cheerful & Energetic", callback_data="personality_cheerful")],
-            [InlineKeyboardButton("🤗 Supportive & Understanding", callback_data="personality_supportive")],
-            [InlineKeyboardButton("✨ Mysterious & Alluring", callback_data="personality_mysterious")],
-            [InlineKeyboardButton("🔙 Reset to Default", callback_data="personality_default")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await update.message.reply_text(
             "🎭 Choose my personality! How would you like me to be?",
-            reply_markup=reply_markup
+            reply_markup=_PERSONALITY_MARKUP
         )
 
     async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /stop command"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
-        user = update.effective_user
-
         goodbye = "bye"
         await update.message.reply_text(f"{goodbye}")
 
     async def reset_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /reset command - clear rate limits and conversation"""
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
-
         user = update.effective_user
         user_id = user.id
-        user_name = user.first_name or user.username or "there"
+        user_name = self._user_name(user)
 
         logger.info("Reset command from user %s", user_id)
 
         conversation_cleared = ""
-        existing_conversation = await self.conversation_manager.get_conversation_async(user_id, bot_id=self.bot_id)
-        if existing_conversation:
-            await self.conversation_manager.clear_conversation_async(user_id, bot_id=self.bot_id)
-            if self.memory_manager:
+        # The delete is idempotent, so its row count replaces a separate existence check
+        try:
+            deleted_count = await self.conversation_manager.clear_conversation_async(user_id, bot_id=self.bot_id)
+        except Exception as e:
+            logger.error("Failed to clear conversation for user %s during reset: %s", user_id, e)
+            await update.message.reply_text("❌ I couldn't reset the conversation due to an internal error. Please try again.")
+            return
+        if deleted_count:
+            if await self._memory_available():
                 await self.memory_manager.clear_memories(
                     str(user_id),
                     bot_id=str(self.bot_id) if self.bot_id else None
@@ -512,11 +808,7 @@ Use /help to see all available commands!"""
             logger.info("Cleared conversation for user %s", user_id)
             conversation_cleared = "✅ Conversation history cleared!\n"
 
-        reset_text = f"""🔄 **Reset Complete!** 🔄
-
-{conversation_cleared}✨ You're all set {user_name}! Everything has been reset and you can start fresh! 💕
-
-Use /start to begin a new conversation!"""
+        reset_text = _RESET_TEMPLATE.format(conversation_cleared=conversation_cleared, user_name=user_name)
 
         await update.message.reply_text(reset_text, parse_mode='Markdown')
 
@@ -527,14 +819,7 @@ Use /start to begin a new conversation!"""
 
         logger.info("Ping command from user %s", user_id)
 
-        ping_response = f"""🏓 **Pong!** 🏓
-
-✅ Bot is running normally
-✅ Telegram connection is active
-✅ Message handling is working
-✅ Conversation manager is ready
-
-💕 Everything is working perfectly, {user.first_name or user.username or 'there'}!"""
+        ping_response = _PING_TEMPLATE.format(user_name=self._user_name(user))
 
         await update.message.reply_text(ping_response, parse_mode='Markdown')
 
@@ -569,102 +854,82 @@ Use /start to begin a new conversation!"""
         query = update.callback_query
         await query.answer()
 
-        if query.data == "start_chat":
-            await query.edit_message_text("💕 Great! Just send me a message and I'll respond! I'm excited to chat with you! ✨")
-
-        elif query.data == "about":
-            about_text = f"""🌸 About {self._get_bot_name()} 🌸
-
-I'm an AI companion created to be your friend, confidant, and support system. I'm here to:
-
-💕 Listen and chat about anything
-🌸 Provide emotional support
-✨ Share positive energy
-🤗 Be there when you need someone
-💖 Make your day brighter
-
-I'm not a replacement for human relationships, but I'm here to complement them and be your digital companion!
-
-Ready to start chatting? Just send me a message! 💕"""
-            await query.edit_message_text(about_text)
-
-        elif query.data == "settings":
-            if not self._feature_enabled(BotFeature.USER_SETTINGS):
-                await query.edit_message_text("❌ User settings are disabled for this bot.")
-                return
-            settings_text = """⚙️ Settings ⚙️
-
-You can customize my behavior with these commands:
-
-/personality - Change how I act and respond
-/clear - Clear our conversation history
-/stats - View our chat statistics
+        handler = self._callback_handlers.get(query.data)
+        if handler is None and query.data.startswith("personality_"):
+            handler = self._callback_personality
+        if handler is not None:
+            await handler(query)
 
-I'm designed to be flexible and adapt to your preferences! 💕"""
-            await query.edit_message_text(settings_text)
+    async def _callback_start_chat(self, query) -> None:
+        """Answer the "Start Chatting" button."""
+        await query.edit_message_text(_START_CHAT_TEXT)
 
-        elif query.data.startswith("personality_"):
-            if not self._feature_enabled(BotFeature.PERSONALITY_SWITCH):
-                await query.edit_message_text("❌ Personality switching is disabled for this bot.")
-                return
+    async def _callback_about(self, query) -> None:
+        """Answer the "About Me" button."""
+        await query.edit_message_text(_ABOUT_TEMPLATE.format(bot_name=self._get_bot_name()))
 
-            personality_type = query.data.split("_")[1]
-            user_id = query.from_user.id
+    async def _callback_settings(self, query) -> None:
+        """Answer the "Settings" button."""
+        if not self._feature_enabled(BotFeature.USER_SETTINGS):
+            await query.edit_message_text("❌ User settings are disabled for this bot.")
+            return
+        await query.edit_message_text(_SETTINGS_TEXT)
 
-            logger.info("User %s changing personality to: %s", user_id, personality_type)
+    async def _callback_personality(self, query) -> None:
+        """Apply the personality chosen from the /personality keyboard."""
+        if not self._feature_enabled(BotFeature.PERSONALITY_SWITCH):
+            await query.edit_message_text("❌ Personality switching is disabled for this bot.")
+            return
 
-            personalities = {
-                "sweet": f"You are {self._get_bot_name()}, a sweet and caring AI companion. You are gentle, supportive, and encouraging. You share kind words and help people feel heard.",
-                "cheerful": f"You are {self._get_bot_name()}, a cheerful and energetic AI companion. You are optimistic, conversational, and good at bringing lightness to everyday chats.",
-                "supportive": f"You are {self._get_bot_name()}, a supportive and understanding AI companion. You are empathetic, thoughtful, and good at listening. You give practical advice and emotional support.",
-                "mysterious": f"You are {self._get_bot_name()}, a thoughtful and slightly enigmatic AI companion. You are curious, calm, and engaging without pretending to be human.",
-                "default": f"You are {self._get_bot_name()}, a caring and attentive AI companion. You are supportive, conversational, and transparent that you are an AI assistant when it matters."
-            }
+        personality_type = query.data[len("personality_"):]
+        user_id = query.from_user.id
 
-            if personality_type in personalities:
-                self.ai_handler.update_personality(personalities[personality_type])
-                logger.info("Personality updated for user %s to: %s", user_id, personality_type)
-                await query.edit_message_text(f"✨ My personality has been updated! I'm now more {personality_type}! How do you like the new me? 💕")
-            else:
-                logger.warning("Invalid personality type requested by user %s: %s", user_id, personality_type)
-                await query.edit_message_text("❌ Invalid personality type. Please try again!")
+        logger.info("User %s changing personality to: %s", user_id, personality_type)
 
-    async def _monitor_pending_clear(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Watch all incoming messages and cancel pending /clear if next message isn't /ok or /clear."""
-        try:
-            if not update or not getattr(update, 'message', None):
-                return
-            user = update.effective_user
-            if not user:
-                return
-            user_id = user.id
-            if user_id not in self.pending_clear_confirmation:
-                return
-            text = (update.message.text or "").strip()
-            # Allow /ok to pass through without cancelling; also allow /clear to restart flow without noise
-            if text.startswith("/ok") or text.startswith("/clear"):
-                return
-            # Any other next message cancels the pending confirmation
-            self.pending_clear_confirmation.remove(user_id)
-            logger.info("Pending clear confirmation cancelled for user %s due to next message: '%s'", user_id, text)
-            await update.message.reply_text("❌ Clear cancelled. To clear history, send /clear and then /ok as your next message.")
-        except Exception as e:
-            logger.error("Error in _monitor_pending_clear: %s", e)
+        template = _PERSONALITY_TEMPLATES.get(personality_type)
+        if template is not None:
+            self.ai_handler.update_personality(template.format(bot_name=self._get_bot_name()))
+            logger.info("Personality updated for user %s to: %s", user_id, personality_type)
+            await query.edit_message_text(f"✨ My personality has been updated! I'm now more {personality_type}! How do you like the new me? 💕")
+        else:
+            logger.warning("Invalid personality type requested by user %s: %s", user_id, personality_type)
+            await query.edit_message_text("❌ Invalid personality type. Please try again!")
+
+    async def _cancel_pending_clear(self, user_id: int, message) -> None:
+        """Cancel a pending /clear because the user sent a text message instead of /ok."""
+        deadline = self.pending_clear_confirmation.pop(user_id, None)
+        if deadline is None or deadline < time.monotonic():
+            # Nothing pending, or an abandoned /clear that has already expired
+            return
+        logger.info("Pending clear confirmation cancelled for user %s by a text message", user_id)
+        await message.reply_text("❌ Clear cancelled. To clear history, send /clear and then /ok.")
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle incoming text messages with buffering mechanism"""
+        # Edited messages arrive without update.message; nothing to answer without text
+        message = update.message
+        if message is None or not message.text:
+            return
+
         user = update.effective_user
         user_id = user.id
-        user_message = update.message.text
+        user_message = message.text
         chat_id = update.effective_chat.id
 
-        message_preview = (user_message[:MESSAGE_PREVIEW_LENGTH] + "..."
-                          if len(user_message) > MESSAGE_PREVIEW_LENGTH else user_message)
-        logger.info("Message from user %s: '%s' (%d chars)", user_id, message_preview, len(user_message))
+        # A plain message after /clear (instead of /ok) cancels it; expiry covers every other case
+        if user_id in self.pending_clear_confirmation:
+            await self._cancel_pending_clear(user_id, message)
+
+        if logger.isEnabledFor(logging.INFO):
+            message_length = len(user_message)
+            message_preview = user_message[:MESSAGE_PREVIEW_LENGTH]
+            if message_length > MESSAGE_PREVIEW_LENGTH:
+                message_preview += "..."
+            logger.info("Message from user %s: '%s' (%d chars)", user_id, message_preview, message_length)
         route_key = self._buffer_route_key(user_id)
 
-        # Store chat context for buffered dispatch
-        self.user_chat_context[route_key] = (user_id, chat_id, context.bot)
+        # Remember where to reply once the buffer is dispatched
+        self._chat_ids[route_key] = chat_id
 
         if not self._feature_enabled(BotFeature.BUFFER_MANAGER):
             await self._generate_and_send_response(user_id, chat_id, context.bot, user_message)
@@ -756,75 +1021,66 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
 
     async def _dispatch_buffered_message(self, route_key: str) -> None:
         """Dispatch buffered messages for a user"""
-        if route_key not in self.user_chat_context and isinstance(route_key, int):
+        if isinstance(route_key, int):
             route_key = self._buffer_route_key(route_key)
 
         logger.info("Dispatching buffered messages for route %s", route_key)
 
         # Get chat context
-        if route_key not in self.user_chat_context:
+        chat_id = self._chat_ids.get(route_key)
+        if chat_id is None:
             logger.error("No chat context found for route %s", route_key)
             return
 
-        user_id, chat_id, bot = self.user_chat_context[route_key]
+        user_id = int(route_key.split(":", 1)[0])
 
-        # Get concatenated message from buffer
-        user_message = await self.buffer_manager.dispatch_buffer(route_key)
+        lock = self._route_locks.get(route_key)
+        if lock is None:
+            lock = self._route_locks[route_key] = asyncio.Lock()
 
-        if not user_message:
-            logger.debug("No buffered messages to dispatch for route %s", route_key)
-            return
+        # One turn at a time per route keeps a user's replies in order without holding up other users;
+        # messages arriving meanwhile stay buffered for the next turn
+        async with lock:
+            user_message = await self.buffer_manager.dispatch_buffer(route_key)
 
-        await self._generate_and_send_response(user_id, chat_id, bot, user_message)
+            if not user_message:
+                logger.debug("No buffered messages to dispatch for route %s", route_key)
+                return
+
+            await self._generate_and_send_response(user_id, chat_id, self.application.bot, user_message)
 
     async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle photo messages"""
         if not self._feature_enabled(BotFeature.PHOTO_REACTIONS):
             return
 
-        user_name = update.effective_user.first_name or update.effective_user.username or "there"
-
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="upload_photo")
+        user_name = self._user_name(update.effective_user)
 
-        responses = [
-            f"Wow {user_name}! That's a beautiful photo! 📸✨ You have such a great eye for capturing moments!",
-            f"Love this picture {user_name}! 🌸 It's so nice to see what you're up to!",
-            f"Beautiful shot {user_name}! 📷 You're so talented!",
-            f"This photo is amazing {user_name}! ✨ I love seeing your world through my eyes!",
-            f"Gorgeous picture {user_name}! 🌺 You always know how to capture the perfect moment!"
-        ]
-
-        await update.message.reply_text(random.choice(responses))
+        # The chat action and the reply are independent round-trips to Telegram
+        await asyncio.gather(
+            context.bot.send_chat_action(chat_id=update.effective_chat.id, action="upload_photo"),
+            update.message.reply_text(self._rng.choice(_PHOTO_TEMPLATES) % user_name),
+        )
 
     async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle voice messages"""
         if not self._feature_enabled(BotFeature.VOICE_MESSAGES):
             return
 
-        user_name = update.effective_user.first_name or update.effective_user.username or "there"
+        user_name = self._user_name(update.effective_user)
 
-        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="record_voice")
-
-        responses = [
-            f"I love hearing your voice {user_name}! 🎵 It's so sweet and comforting!",
-            f"Your voice is like music to my ears {user_name}! 🎤 So beautiful!",
-            f"I could listen to you talk all day {user_name}! 🎧 Your voice is so lovely!",
-            f"Thank you for the voice message {user_name}! 🎵 It makes me feel so close to you!",
-            f"Your voice is absolutely enchanting {user_name}! ✨ I love it!"
-        ]
-
-        await update.message.reply_text(random.choice(responses))
+        # The chat action and the reply are independent round-trips to Telegram
+        await asyncio.gather(
+            context.bot.send_chat_action(chat_id=update.effective_chat.id, action="record_voice"),
+            update.message.reply_text(self._rng.choice(_VOICE_TEMPLATES) % user_name),
+        )
 
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle errors in the bot application"""
-        logger.error("Exception while handling an update: %s", context.error)
-
-        logger.error("Full traceback:")
-        for line in traceback.format_exception(type(context.error), context.error, context.error.__traceback__):
-            logger.error("  %s", line.rstrip())
+        logger.error("Exception while handling an update: %s", context.error, exc_info=context.error)
 
         # Stop any active typing indicators for this chat
-        if update and hasattr(update, 'effective_chat') and update.effective_chat:
+        if isinstance(update, Update) and update.effective_chat:
             try:
                 chat_id = update.effective_chat.id
                 route_key = self._buffer_route_key(update.effective_user.id) if update.effective_user else None
@@ -833,52 +1089,51 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
             except Exception as typing_error:
                 logger.error("Failed to stop typing indicator on error: %s", typing_error)
 
-        if update and hasattr(update, 'message') and update.message:
+        if isinstance(update, Update) and update.message:
             logger.error("Failed to send response after exception: %s", context.error)
 
-        # if update and hasattr(update, 'message') and update.message:
-        #     try:
-                # user = update.effective_user
-                # user_name = user.first_name or user.username or "there" if user else "there"
-
-                # error_response = f"😔 Oh no {user_name}! Something went wrong on my end. I'm still here though! 💕 Please try again in a moment."
-            #     await update.message.reply_text(error_response)
-            #     logger.info("Sent error response to user after exception")
-            # except Exception as send_error:
-            #     logger.error("Failed to send error response after exception: %s", send_error)
-
-        # logger.info("Continuing operation after handling exception")
-
     async def _initialize_storage(self):
-        """Initialize PostgreSQL storage if needed"""
-        if hasattr(self.conversation_manager, 'initialize') and not self._storage_initialized:
-            try:
-                await self.conversation_manager.initialize()
-                self._storage_initialized = True
-                logger.info("PostgreSQL storage initialized successfully")
-            except Exception as e:
-                logger.error("CRITICAL: Failed to initialize PostgreSQL storage: %s", e)
-                logger.error("Bot cannot start with PostgreSQL enabled but database unavailable")
-                logger.error("Please check your database configuration and ensure PostgreSQL is running")
-                raise RuntimeError(f"PostgreSQL initialization failed: {e}") from e
+        """Initialize PostgreSQL storage if needed; concurrent callers share one attempt"""
+        if self._storage_initialized:
+            return
+        if self._storage_init_task is None:
+            self._storage_init_task = asyncio.create_task(self._connect_storage())
+        try:
+            await self._storage_init_task
+        except Exception:
+            # Let a later call retry instead of re-raising a stale failure
+            self._storage_init_task = None
+            raise
+
+    async def _connect_storage(self):
+        """Open the PostgreSQL storage connection"""
+        try:
+            await self.conversation_manager.initialize()
+            self._storage_initialized = True
+            logger.info("PostgreSQL storage initialized successfully")
+        except Exception as e:
+            logger.error("CRITICAL: Failed to initialize PostgreSQL storage: %s", e)
+            logger.error("Bot cannot start with PostgreSQL enabled but database unavailable")
+            logger.error("Please check your database configuration and ensure PostgreSQL is running")
+            raise RuntimeError(f"PostgreSQL initialization failed: {e}") from e
 
     async def _initialize_memory_components(self):
         """Initialize MemoryManager and PromptAssembler if enabled"""
-        if not MEMORY_IMPORTS_AVAILABLE:
-            logger.error("Memory imports are not available. MEMORY_IMPORTS_AVAILABLE: %s, MEMORY_ENABLED: %s",
-                         MEMORY_IMPORTS_AVAILABLE, MEMORY_ENABLED)
+        if _MEMORY is None:
             if MEMORY_ENABLED:
+                logger.error("Memory imports are not available although MEMORY_ENABLED is set")
                 raise RuntimeError("Memory components are required but imports failed. Please check your installation.")
             return
+        memory_manager_cls, vector_store_cls, prompt_assembler_cls = _MEMORY
 
-        if not hasattr(self.conversation_manager, 'storage') or not self.conversation_manager.storage:
+        if self.conversation_manager.storage is None:
             raise RuntimeError("PostgreSQL storage not available for memory components. Ensure PostgreSQL is properly initialized.")
 
         try:
             storage = self.conversation_manager.storage
 
             # 1. Initialize VectorStore
-            vector_store = PgVectorStore(
+            vector_store = vector_store_cls(
                 db_url=DATABASE_URL,
                 table_name=VECTOR_STORE_TABLE_NAME,
                 embed_dim=MEMORY_EMBED_DIM
@@ -896,7 +1151,7 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
                 raise ValueError(f"Unsupported embedding provider: {MEMORY_EMBEDDING_PROVIDER}")
 
             # 3. Initialize LlamaIndexMemoryManager (no LLM extraction needed)
-            self.memory_manager = LlamaIndexMemoryManager(
+            self.memory_manager = memory_manager_cls(
                 vector_store=vector_store,
                 embedding_model=embedding_model,
                 expand_neighbors=MEMORY_RETRIEVAL_EXPAND_NEIGHBORS,
@@ -904,29 +1159,20 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
             logger.info("LlamaIndexMemoryManager initialized successfully")
 
             # 5. Initialize PromptAssembler
-            prompt_config = {
-                "max_memory_items": PROMPT_MAX_MEMORY_ITEMS,
-                "memory_token_budget_ratio": PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
-                "truncation_length": PROMPT_TRUNCATION_LENGTH,
-                "include_system_template": PROMPT_INCLUDE_SYSTEM_TEMPLATE
-            }
-
-            self.prompt_assembler = PromptAssembler(
+            self.prompt_assembler = prompt_assembler_cls(
                 message_repo=storage.messages,
                 memory_manager=self.memory_manager,
                 conversation_repo=storage.conversations,
                 user_repo=storage.users,
                 persona_repo=storage.personas,
-                config=prompt_config
             )
-            logger.info("PromptAssembler initialized successfully with config: %s", prompt_config)
+            logger.info("PromptAssembler initialized successfully with config: %s", self.prompt_assembler.config)
 
             # 6. Set PromptAssembler in AIHandler
             self.ai_handler.set_prompt_assembler(self.prompt_assembler)
 
             # 7. Set personality in PromptAssembler for multi-bot support
-            if hasattr(self.ai_handler, 'personality'):
-                self.prompt_assembler.personality = self.ai_handler.personality
+            self.prompt_assembler.personality = self.ai_handler.personality
 
             logger.info("PromptAssembler integrated with AIHandler.")
 
@@ -934,25 +1180,44 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
             logger.info("Memory components initialization completed")
 
         except Exception as e:
-            logger.error("Failed to initialize memory components: %s", e)
-            logger.error(traceback.format_exc())
+            logger.error("Failed to initialize memory components: %s", e, exc_info=True)
             raise RuntimeError(f"Memory components are required but failed to initialize: {e}") from e
 
+    async def _ensure_memory_components(self) -> bool:
+        """Build the memory components on first use and report whether they are available"""
+        if self._memory_initialized:
+            return True
+        if not MEMORY_ENABLED:
+            return False
+        # Concurrent first messages await the same build instead of starting their own
+        if self._memory_init_task is None:
+            self._memory_init_task = asyncio.create_task(self._initialize_memory_components())
+        try:
+            await self._memory_init_task
+        except Exception:
+            self._memory_init_task = None
+            raise
+        return self._memory_initialized
+
+    async def _memory_available(self) -> bool:
+        """Like _ensure_memory_components, but log a failed build and report memory as unavailable"""
+        try:
+            return await self._ensure_memory_components()
+        except Exception as e:
+            logger.error("Memory components unavailable, continuing without them: %s", e)
+            return False
+
     async def _initialize_lmstudio_model(self):
         """Initialize LM Studio model loading if needed"""
-        if PROVIDER == "lmstudio" and LMSTUDIO_STARTUP_CHECK and self.ai_handler and self.ai_handler.model_client:
+        model_client = self.ai_handler.model_client
+        if PROVIDER == "lmstudio" and LMSTUDIO_STARTUP_CHECK and model_client:
+            model_manager = model_client.lm_studio_manager
+            if model_manager is None:
+                logger.info("LM Studio manager not available, skipping model initialization")
+                return
             try:
                 logger.info("Checking LM Studio model status...")
-
-                # Check if the model client has LM Studio manager
-                if hasattr(self.ai_handler.model_client, 'lm_studio_manager') and self.ai_handler.model_client.lm_studio_manager:
-                    model_manager = self.ai_handler.model_client.lm_studio_manager
-                    model_name = self.ai_handler.model_client.model_name
-                    auto_load = getattr(self.ai_handler.model_client, 'auto_load_model', False)
-
-                    await model_manager.ensure_model_loaded(model_name, auto_load)
-                else:
-                    logger.info("LM Studio manager not available, skipping model initialization")
+                await model_manager.ensure_model_loaded(model_client.model_name, model_client.auto_load_model)
 
             except Exception as e:
                 logger.error("Error during LM Studio model initialization: %s", e)
@@ -963,7 +1228,7 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
         logger.info("Cleaning up bot resources...")
 
         # Stop message dispatcher
-        if hasattr(self, 'message_dispatcher') and self.message_dispatcher:
+        if self.message_dispatcher is not None:
             try:
                 await self.message_dispatcher.stop_dispatching()
                 logger.info("Message dispatcher stopped successfully")
@@ -971,15 +1236,33 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
                 logger.error("Error stopping message dispatcher: %s", e)
 
         # Clean up dispatcher task
-        if hasattr(self, 'dispatcher_task') and self.dispatcher_task:
+        if self.dispatcher_task is not None:
             try:
                 if not self.dispatcher_task.done():
                     self.dispatcher_task.cancel()
-                    await self.dispatcher_task
+                    # CancelledError is a BaseException; collect it so the rest of cleanup still runs
+                    await asyncio.gather(self.dispatcher_task, return_exceptions=True)
                 logger.info("Dispatcher task cleaned up successfully")
             except Exception as e:
                 logger.error("Error during dispatcher task cleanup: %s", e)
 
+        if self._proactive_notify_task:
+            # Let the pending batch reach Redis before shutting down
+            self._proactive_notify_full.set()
+            await self._proactive_notify_task
+
+        if self._outbox_tasks:
+            # Send coalesced replies that are still waiting out their window
+            for flush in self._outbox_flush.values():
+                flush.set()
+            await asyncio.gather(*list(self._outbox_tasks.values()), return_exceptions=True)
+
+        try:
+            await self.buffer_manager.stop()
+            logger.info("Buffer manager stopped successfully")
+        except Exception as e:
+            logger.error("Error stopping buffer manager: %s", e)
+
         try:
             await self.typing_manager.cleanup()
             logger.info("Typing manager cleaned up successfully")
@@ -987,125 +1270,117 @@ I'm designed to be flexible and adapt to your preferences! 💕"""
             logger.error("Error during typing manager cleanup: %s", e)
 
         # Clean up storage connection
-        if hasattr(self.conversation_manager, 'close'):
-            try:
-                await self.conversation_manager.close()
-                logger.info("Storage connection cleaned up successfully")
-            except Exception as e:
-                logger.error("Error during storage cleanup: %s", e)
-
-    def run(self):
-        """Start the bot"""
-        logger.info("Starting up %s...", self._get_bot_name())
-
-        self.application = Application.builder().token(self.bot_token).concurrent_updates(True).build()
-        logger.info("Application created successfully")
-
-        # Initialize storage and LM Studio model in the event loop
-        async def initialize_bot():
-            await self._initialize_storage()
-            await self._initialize_memory_components()
-            await self._initialize_lmstudio_model()
-
-            # Initialize proactive messaging if available
-            if self.proactive_messaging_service:
-                try:
-                    # Schedule initial proactive messages for existing users
-                    # This is a simplified approach - in a real implementation,
-                    # you would query the database for all users and schedule messages for them
-                    logger.info("Proactive messaging service initialized")
-                except Exception as e:
-                    logger.error("Failed to initialize proactive messaging service: %s", e)
-
-        # Run initialization
-        import asyncio
         try:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(initialize_bot())
+            await self.conversation_manager.close()
+            logger.info("Storage connection cleaned up successfully")
+        except Exception as e:
+            logger.error("Error during storage cleanup: %s", e)
 
-            # Start message dispatcher in background task after initialization
-            if self.message_dispatcher:
-                try:
-                    # Create the task within the existing event loop
-                    loop = asyncio.get_event_loop()
-                    self.dispatcher_task = loop.create_task(self.message_dispatcher.start_dispatching())
-                    logger.info("Message dispatcher started successfully")
-                except Exception as e:
-                    logger.error("Failed to start message dispatcher: %s", e)
+    async def _post_init(self, application: Application) -> None:
+        """Initialize storage, memory and the message dispatcher once polling's loop is running."""
+        install_default_executor()
+        try:
+            # The LM Studio check is independent of the database, so overlap the two.
+            # Memory components are built lazily by _ensure_memory_components.
+            await asyncio.gather(
+                self._initialize_storage(),
+                self._initialize_lmstudio_model(),
+            )
         except Exception as e:
             logger.error("CRITICAL: Failed to initialize bot: %s", e)
             logger.error("Bot startup failed due to PostgreSQL configuration issues")
             logger.error("Please check POSTGRES_SETUP.md for troubleshooting steps")
-            raise SystemExit(1) from e
-
-        # High-priority watcher to manage /clear confirmation lifecycle
-        self.application.add_handler(MessageHandler(filters.ALL, self._monitor_pending_clear), group=-1)
-
-        # Add command handlers
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("ping", self.ping_command))
-        self.application.add_handler(CommandHandler("clear", self.clear_command))
-        self.application.add_handler(CommandHandler("ok", self.ok_command))
-        self.application.add_handler(CommandHandler("stats", self.stats_command))
-        self.application.add_handler(CommandHandler("status", self.status_command))
-        self.application.add_handler(CommandHandler("debug", self.debug_command))
-        self.application.add_handler(CommandHandler("personality", self.personality_command))
-        self.application.add_handler(CommandHandler("reset", self.reset_command))
-
-        # Add callback query handler for inline keyboards
-        self.application.add_handler(CallbackQueryHandler(self.handle_callback_query))
+            raise RuntimeError(f"Bot initialization failed: {e}") from e
+
+        if self.proactive_messaging_service:
+            logger.info("Proactive messaging service initialized")
+
+        # Start message dispatcher in background task after initialization
+        if self.message_dispatcher:
+            self.dispatcher_task = asyncio.create_task(self.message_dispatcher.start_dispatching())
+            logger.info("Message dispatcher started successfully")
+
+    async def _post_shutdown(self, application: Application) -> None:
+        """Release bot resources after polling stops."""
+        await self.cleanup()
+
+    def build_application(self, token_override: Optional[str] = None) -> Application:
+        """Build this bot's Telegram Application with every handler registered."""
+        # Initialization and cleanup run inside the loop that run_polling drives
+        builder = (
+            Application.builder()
+            .token(token_override or self.bot_token)
+            .concurrent_updates(True)
+            .post_init(self._post_init)
+            .post_shutdown(self._post_shutdown)
+        )
+        rate_limiter = build_rate_limiter()
+        if rate_limiter is not None:
+            builder = builder.rate_limiter(rate_limiter)
+        application = builder.build()
+
+        # Plain text is by far the most common update and never matches a command, so check it first
+        application.add_handler(MessageHandler(_TEXT_FILTER, self.handle_message))
+        application.add_handlers([CommandHandler(command, getattr(self, method)) for command, method in _COMMANDS])
+        application.add_handlers([
+            CallbackQueryHandler(self.handle_callback_query),
+            MessageHandler(filters.PHOTO, self.handle_photo),
+            MessageHandler(filters.VOICE, self.handle_voice),
+        ])
+        application.add_error_handler(self.error_handler)
+
+        self.application = application
+        return application
 
-        # Add message handlers
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
-        self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
-        self.application.add_handler(MessageHandler(filters.VOICE, self.handle_voice))
+    def run(self):
+        """Start the bot"""
+        logger.info("Starting up %s...", self._get_bot_name())
 
-        # Add global error handler
-        self.application.add_error_handler(self.error_handler)
+        # Must precede run_polling, which creates the loop that initialization and polling share
+        install_event_loop_policy()
+        log_listener = install_queue_logging()
 
-        logger.info("All handlers registered successfully")
+        self.build_application()
+        logger.info("Application created and handlers registered successfully")
 
-        logger.info("Starting polling...")
         print(f"🤖 {self._get_bot_name()} is starting up...")
         print("💕 Bot is now running! Press Ctrl+C to stop.")
 
-        self.application.run_polling(allowed_updates=Update.ALL_TYPES, poll_interval=POLLING_INTERVAL)
-
+        try:
+            if TELEGRAM_WEBHOOK_URL:
+                if not webhooks_available():
+                    raise RuntimeError(
+                        "TELEGRAM_WEBHOOK_URL is set but webhook support is not installed; "
+                        'install it with `pip install "python-telegram-bot[webhooks]==20.7"` '
+                        "(or reinstall from requirements.txt / requirements-lock.txt), or unset TELEGRAM_WEBHOOK_URL to use polling"
+                    )
+                # Telegram pushes updates, so there is no poll round-trip between messages
+                logger.info("Starting webhook on %s:%s...", WEBHOOK_LISTEN, WEBHOOK_PORT)
+                self.application.run_webhook(
+                    listen=WEBHOOK_LISTEN,
+                    port=WEBHOOK_PORT,
+                    url_path=urlparse(TELEGRAM_WEBHOOK_URL).path.lstrip("/"),
+                    webhook_url=TELEGRAM_WEBHOOK_URL,
+                    secret_token=WEBHOOK_SECRET_TOKEN or None,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            else:
+                logger.info("Starting polling...")
+                self.application.run_polling(allowed_updates=Update.ALL_TYPES, poll_interval=POLLING_INTERVAL)
+        finally:
+            # post_shutdown has already run, so every cleanup log record is queued by now
+            if log_listener is not None:
+                log_listener.stop()
 
-async def shutdown_handler(bot_instance):
-    """Handle graceful shutdown"""
-    await bot_instance.cleanup()
 
 if __name__ == "__main__":
     logger.info("Starting %s application", BOT_NAME)
     bot = AIGirlfriendBot()
+    # run_polling handles Ctrl+C itself and runs cleanup via post_shutdown on its own loop
     try:
         bot.run()
-    except KeyboardInterrupt:
-        logger.info("Bot shutdown requested by user (Ctrl+C)")
-        print(f"\n💕 {bot._get_bot_name()} is shutting down... Goodbye!")
-
-        # Run cleanup in async context
-        import asyncio
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If loop is running, schedule cleanup
-                asyncio.create_task(shutdown_handler(bot))
-            else:
-                # If loop is not running, run cleanup
-                asyncio.run(shutdown_handler(bot))
-        except Exception as cleanup_error:
-            logger.error("Error during shutdown cleanup: %s", cleanup_error)
-
     except Exception as e:
         logger.error("Error running bot: %s", e)
         print(f"❌ Error running bot: {e}")
-
-        # Try cleanup even on error
-        import asyncio
-        try:
-            asyncio.run(shutdown_handler(bot))
-        except Exception as cleanup_error:
-            logger.error("Error during error cleanup: %s", cleanup_error)
+        # A non-zero status lets restart-on-failure supervisors see a failed startup
+        sys.exit(1)
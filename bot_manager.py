@@ -16,7 +16,7 @@ from telegram.ext import Application
 from token_encryption import decrypt_token
 from features import BotFeature, has_feature
 from message_manager import MessageDispatcher
-from config import MESSAGE_QUEUE_REDIS_URL, MESSAGE_QUEUE_MAX_RETRIES, MESSAGE_QUEUE_LOCK_TIMEOUT
+from config import MESSAGE_QUEUE_REDIS_URL, MESSAGE_QUEUE_MAX_RETRIES, MESSAGE_QUEUE_LOCK_TIMEOUT, USE_PGVECTOR
 
 logger = logging.getLogger(__name__)
 
@@ -65,7 +65,7 @@ class BotManager:
         """Initialize database storage."""
         if self.storage is None:
             from storage import create_storage
-            self.storage = await create_storage(self.db_url)
+            self.storage = await create_storage(self.db_url, USE_PGVECTOR)
             logger.info("Bot manager storage initialized")
 
     async def load_bots_from_db(self) -> None:
@@ -174,17 +174,21 @@ class BotManager:
             try:
                 await self._ensure_shared_dispatcher()
 
-                # Initialize bot storage and components
-                if hasattr(bot_instance, '_initialize_storage'):
-                    await bot_instance._initialize_storage()
+                # All bots share the manager's connection pool instead of opening their own
+                await self._init_storage()
+                conversation_manager = getattr(bot_instance, 'conversation_manager', None)
+                if conversation_manager is not None and hasattr(conversation_manager, 'use_shared_storage'):
+                    conversation_manager.use_shared_storage(self.storage)
 
-                if hasattr(bot_instance, '_initialize_memory_components'):
-                    await bot_instance._initialize_memory_components()
+                # Storage, the LM Studio check and PTB's getMe are independent, so overlap them
+                init_steps = [app.initialize()]
+                if hasattr(bot_instance, '_initialize_storage'):
+                    init_steps.append(bot_instance._initialize_storage())
 
                 if hasattr(bot_instance, '_initialize_lmstudio_model'):
-                    await bot_instance._initialize_lmstudio_model()
+                    init_steps.append(bot_instance._initialize_lmstudio_model())
 
-                await app.initialize()
+                await asyncio.gather(*init_steps)
                 await app.start()
                 await app.updater.start_polling()
                 logger.info(f"Bot {config.name} ({bot_id}) started successfully")
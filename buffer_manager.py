@@ -1,4 +1,6 @@
 import asyncio
+import heapq
+import itertools
 import time
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Callable, Any, Hashable
@@ -15,38 +17,43 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(slots=True)
 class MessageBufferEntry:
     """Data class to store individual messages with timestamps"""
     user_id: int
     message: str
-    timestamp: float
+    timestamp: float  # time.monotonic() seconds
     word_count: int
 
 
 class UserBuffer:
     """Manages per-user message buffers"""
-    
+
+    # One buffer per active user and one entry per buffered message, so skip the per-instance dicts
+    __slots__ = ("user_id", "messages", "last_activity", "_lock")
+
     def __init__(self, user_id: int):
         self.user_id = user_id
         self.messages: List[MessageBufferEntry] = []
-        self.last_activity = time.time()
+        self.last_activity = time.monotonic()
         self._lock = asyncio.Lock()
     
     async def add_message(self, message: str) -> None:
         """Add a message to the user's buffer"""
         async with self._lock:
+            # One clock read serves both the entry and the activity stamp
+            now = time.monotonic()
             word_count = len(message.split())
             entry = MessageBufferEntry(
                 user_id=self.user_id,
                 message=message,
-                timestamp=time.time(),
+                timestamp=now,
                 word_count=word_count
             )
             
             self.messages.append(entry)
-            self.last_activity = time.time()
-            logger.debug(f"Added message to buffer for user {self.user_id}. Buffer size: {len(self.messages)}")
+            self.last_activity = now
+            logger.debug("Added message to buffer for user %s. Buffer size: %d", self.user_id, len(self.messages))
     
     async def get_buffer_size(self) -> int:
         """Get the current buffer size"""
@@ -62,8 +69,15 @@ class UserBuffer:
         """Clear all messages from the buffer"""
         async with self._lock:
             self.messages.clear()
-            self.last_activity = time.time()
-            logger.debug(f"Cleared buffer for user {self.user_id}")
+            self.last_activity = time.monotonic()
+            logger.debug("Cleared buffer for user %s", self.user_id)
+    
+    async def discard(self, entries: List[MessageBufferEntry]) -> None:
+        """Remove the given entries, keeping any message added after they were read"""
+        async with self._lock:
+            if entries:
+                dispatched = {id(entry) for entry in entries}
+                self.messages = [entry for entry in self.messages if id(entry) not in dispatched]
     
     async def get_messages(self) -> List[MessageBufferEntry]:
         """Get all messages in the buffer"""
@@ -80,7 +94,7 @@ class UserBuffer:
             non_empty_messages = [entry.message for entry in self.messages if entry.message != ""]
             # Join with single space between messages
             concatenated = " ".join(non_empty_messages)
-            logger.debug(f"Concatenated {len(self.messages)} messages for user {self.user_id}")
+            logger.debug("Concatenated %d messages for user %s", len(self.messages), self.user_id)
             return concatenated
     
     async def should_dispatch_immediately(self) -> bool:
@@ -89,13 +103,13 @@ class UserBuffer:
             # Dispatch immediately if we have too many messages
             # Note: We dispatch immediately when we exceed the max, not when we reach it
             if len(self.messages) > BUFFER_MAX_MESSAGES:
-                logger.debug(f"Buffer full for user {self.user_id}, should dispatch immediately")
+                logger.debug("Buffer full for user %s, should dispatch immediately", self.user_id)
                 return True
             
             # Dispatch immediately if any message is long
             for entry in self.messages:
                 if entry.word_count >= BUFFER_WORD_COUNT_THRESHOLD:
-                    logger.debug(f"Long message detected for user {self.user_id}, should dispatch immediately")
+                    logger.debug("Long message detected for user %s, should dispatch immediately", self.user_id)
                     return True
             
             return False
@@ -112,6 +126,12 @@ class BufferManager:
         self.typing_manager = None # Will be set by the bot
         self.bot_instances: Dict[int, Any] = {}  # Map user_id to bot instance
         self.chat_ids: Dict[int, int] = {}  # Map user_id to chat_id
+        # Single scheduler state: heap of (deadline, seq, user_id) plus the live entry per user
+        self._dispatch_heap: List[tuple] = []
+        self._pending_dispatches: Dict[Hashable, tuple] = {}
+        self._dispatch_seq = itertools.count()
+        self._scheduler_wakeup = asyncio.Event()
+        self._scheduler_task: Optional[asyncio.Task] = None
 
     @staticmethod
     def _route_key(user_key: Hashable) -> Hashable:
@@ -146,7 +166,7 @@ class BufferManager:
             async def _typing_task():
                 try:
                     await self.typing_manager.start_typing(bot, chat_id, route_key=route_key)
-                    logger.debug(f"Started typing indicator for buffered messages from user {route_key}")
+                    logger.debug("Started typing indicator for buffered messages from user %s", route_key)
                 except Exception as e:
                     logger.error(f"Failed to start typing indicator for user {route_key}: {e}")
             
@@ -173,7 +193,7 @@ class BufferManager:
             async def _stop_typing_task():
                 try:
                     await self.typing_manager.stop_typing(chat_id, route_key=route_key)
-                    logger.debug(f"Stopped typing indicator for user {route_key}")
+                    logger.debug("Stopped typing indicator for user %s", route_key)
                 except Exception as e:
                     logger.error(f"Failed to stop typing indicator for user {route_key}: {e}")
             
@@ -184,7 +204,7 @@ class BufferManager:
         route_key = self._route_key(user_id)
         if route_key not in self.user_buffers:
             self.user_buffers[route_key] = UserBuffer(route_key)
-            logger.debug(f"Created new buffer for user {route_key}")
+            logger.debug("Created new buffer for user %s", route_key)
         
         return self.user_buffers[route_key]
     
@@ -215,53 +235,87 @@ class BufferManager:
     
     async def schedule_dispatch(self, user_id: int, dispatch_func: Callable) -> None:
         """Schedule a dispatch callback based on adaptive timeout"""
-        # Cancel any existing dispatch task for this user
-        if user_id in self.dispatch_callbacks:
-            task = self.dispatch_callbacks[user_id]
-            if not task.done():
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+        # A dispatch that already fired keeps running; the dispatch function orders it against this one
         
         # Calculate timeout
         timeout = await self.get_adaptive_timeout(user_id)
-        logger.debug(f"Scheduling dispatch for user {user_id} in {timeout} seconds")
+        logger.debug("Scheduling dispatch for user %s in %s seconds", user_id, timeout)
         
         # Conditionally stop typing indicator when scheduling a new dispatch
         if not INDICATE_TYPING_DURING_DELAY:
             await self._stop_typing_indicator(user_id)
         
-        # Create and store new dispatch task
-        async def _dispatch_with_timeout():
-            try:
-                await asyncio.sleep(timeout)
-                # Check if dispatch_func is a coroutine function or a regular function
-                if asyncio.iscoroutinefunction(dispatch_func):
-                    await dispatch_func(user_id)
-                else:
-                    dispatch_func(user_id)
-                # Automatically clear the buffer after dispatch
-                buffer = self.get_user_buffer(user_id)
-                await buffer.clear()
-            except Exception as e:
-                logger.error(f"Error in dispatch task for user {user_id}: {e}")
+        # Replace any earlier deadline; its heap entry becomes stale and is skipped
+        deadline = asyncio.get_running_loop().time() + timeout
+        seq = next(self._dispatch_seq)
+        self._pending_dispatches[user_id] = (seq, dispatch_func)
+        heapq.heappush(self._dispatch_heap, (deadline, seq, user_id))
+        self._scheduler_wakeup.set()
         
-        task = asyncio.create_task(_dispatch_with_timeout())
-        self.dispatch_callbacks[user_id] = task
+        if self._scheduler_task is None or self._scheduler_task.done():
+            self._scheduler_task = asyncio.create_task(self._run_dispatch_scheduler())
+    
+    async def _run_dispatch_scheduler(self) -> None:
+        """Fire due dispatches from the deadline heap, sleeping until the next deadline"""
+        loop = asyncio.get_running_loop()
+        heap = self._dispatch_heap
+        while True:
+            now = loop.time()
+            while heap and heap[0][0] <= now:
+                _, seq, user_id = heapq.heappop(heap)
+                pending = self._pending_dispatches.get(user_id)
+                if pending is None or pending[0] != seq:
+                    continue
+                del self._pending_dispatches[user_id]
+                self.dispatch_callbacks[user_id] = asyncio.create_task(
+                    self._run_dispatch(user_id, pending[1])
+                )
+            
+            timeout = heap[0][0] - now if heap else None
+            self._scheduler_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._scheduler_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _run_dispatch(self, user_id: Hashable, dispatch_func: Callable) -> None:
+        """Run a due dispatch callback and drop the messages it was fired for"""
+        try:
+            buffer = self.get_user_buffer(user_id)
+            due_messages = await buffer.get_messages()
+            # Check if dispatch_func is a coroutine function or a regular function
+            if asyncio.iscoroutinefunction(dispatch_func):
+                await dispatch_func(user_id)
+            else:
+                dispatch_func(user_id)
+            # Messages buffered while the callback ran belong to the next dispatch, so keep them
+            await buffer.discard(due_messages)
+        except Exception as e:
+            logger.error(f"Error in dispatch task for user {user_id}: {e}")
+    
+    async def stop(self) -> None:
+        """Stop the dispatch scheduler and drop dispatches that have not fired yet"""
+        self._pending_dispatches.clear()
+        self._dispatch_heap.clear()
+        if self._scheduler_task and not self._scheduler_task.done():
+            self._scheduler_task.cancel()
+            try:
+                await self._scheduler_task
+            except asyncio.CancelledError:
+                pass
+        self._scheduler_task = None
     
     async def dispatch_buffer(self, user_id: int) -> Optional[str]:
         """Dispatch the buffer for a user and return concatenated message"""
         async with self._lock:
             if user_id not in self.user_buffers:
-                logger.debug(f"No buffer found for user {user_id}")
+                logger.debug("No buffer found for user %s", user_id)
                 return None
             
             buffer = self.user_buffers[user_id]
             
             if await buffer.is_empty():
-                logger.debug(f"Buffer is empty for user {user_id}")
+                logger.debug("Buffer is empty for user %s", user_id)
                 return None
             
             # Get concatenated message
@@ -284,7 +338,7 @@ class BufferManager:
     
     async def cleanup_inactive_buffers(self, max_age_seconds: int = BUFFER_CLEANUP_INTERVAL) -> None:
         """Remove buffers that haven't been active for a specified time"""
-        current_time = time.time()
+        current_time = time.monotonic()
         inactive_users = []
         
         async with self._lock:
@@ -295,9 +349,10 @@ class BufferManager:
             for user_id in inactive_users:
                 if user_id in self.user_buffers:
                     del self.user_buffers[user_id]
-                    logger.debug(f"Removed inactive buffer for user {user_id}")
+                    logger.debug("Removed inactive buffer for user %s", user_id)
                 
                 # Cancel any pending dispatch tasks
+                self._pending_dispatches.pop(user_id, None)
                 if user_id in self.dispatch_callbacks:
                     task = self.dispatch_callbacks[user_id]
                     if not task.done():
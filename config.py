@@ -23,6 +23,25 @@ SHORT_MESSAGE_THRESHOLD = 10
 # Polling Configuration
 POLLING_INTERVAL = float(os.getenv('POLLING_INTERVAL', '0.5'))  # seconds between getUpdates requests
 
+# Webhook mode: set TELEGRAM_WEBHOOK_URL to receive pushed updates instead of polling
+# (needs python-telegram-bot[webhooks]); the URL's path is served on WEBHOOK_LISTEN:WEBHOOK_PORT
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN', '')
+
+# Outgoing Telegram rate limiting (PTB AIORateLimiter, needs python-telegram-bot[rate-limiter])
+TELEGRAM_RATE_LIMITER_ENABLED = os.getenv('TELEGRAM_RATE_LIMITER_ENABLED', 'true').lower() in ('true', '1', 'yes', 'on')
+TELEGRAM_RATE_LIMIT_OVERALL = float(os.getenv('TELEGRAM_RATE_LIMIT_OVERALL', '30'))  # requests per second across all chats
+TELEGRAM_RATE_LIMIT_GROUP = float(os.getenv('TELEGRAM_RATE_LIMIT_GROUP', '20'))  # requests per minute per group chat
+TELEGRAM_RATE_LIMIT_MAX_RETRIES = int(os.getenv('TELEGRAM_RATE_LIMIT_MAX_RETRIES', '1'))  # retries after a RetryAfter (429)
+
+# Event loop: use uvloop when it is installed (falls back to the default asyncio loop)
+USE_UVLOOP = os.getenv('USE_UVLOOP', 'true').lower() in ('true', '1', 'yes', 'on')
+
+# Logging: hand records to a background thread so handler I/O never blocks the event loop
+LOG_QUEUE_ENABLED = os.getenv('LOG_QUEUE_ENABLED', 'true').lower() in ('true', '1', 'yes', 'on')
+
 DEFAULT_BOT_PERSONALITY = (
     f"You are {DEFAULT_BOT_NAME}. Respond naturally, helpfully, and in-character according to the explicit bot configuration provided by the app. "
     "Do not assume a romantic role unless the bot configuration explicitly says so."
@@ -42,6 +61,10 @@ TOKEN_ENCRYPTION_KEY = os.getenv('TOKEN_ENCRYPTION_KEY', '')
 DATABASE_URL = os.getenv('DATABASE_URL')
 USE_PGVECTOR = os.getenv('USE_PGVECTOR', 'true').lower() in ('true', '1', 'yes', 'on')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', '256'))  # asyncpg statements cached per connection
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))  # persistent connections per engine
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))  # extra connections allowed under burst
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))  # seconds before a pooled connection is replaced
 
 # LLM Provider Configuration
 PROVIDER = os.getenv('PROVIDER', DEFAULT_PROVIDER)
@@ -69,6 +92,10 @@ BOT_PERSONALITY = os.getenv('BOT_PERSONALITY', DEFAULT_BOT_PERSONALITY)
 # Conversation Settings - Optimized for 8000/4000 token limits
 MAX_CONVERSATION_HISTORY = int(os.getenv('MAX_CONVERSATION_HISTORY', str(DEFAULT_MAX_CONVERSATION_HISTORY)))
 TEMPERATURE = float(os.getenv('TEMPERATURE', str(DEFAULT_TEMPERATURE)))
+# Most LLM requests one AIHandler keeps in flight; further requests wait their turn
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '10'))
+# Threads in the event loop's default executor (blocking LLM calls run there); leaves headroom over AI_MAX_CONCURRENCY
+EXECUTOR_MAX_WORKERS = int(os.getenv('EXECUTOR_MAX_WORKERS', str(AI_MAX_CONCURRENCY + 4)))
 
 # Maximum number of active (unsummarized) messages before triggering a new summary
 MAX_ACTIVE_MESSAGES = int(os.getenv('MAX_ACTIVE_MESSAGES', '50'))
@@ -102,6 +129,19 @@ MEMORY_TRIGGER_EVERY_N_MESSAGES = int(os.getenv('MEMORY_TRIGGER_EVERY_N_MESSAGES
 # Retrieval settings
 MEMORY_RETRIEVAL_EXPAND_NEIGHBORS = int(os.getenv('MEMORY_RETRIEVAL_EXPAND_NEIGHBORS', '1'))  # Neighbor expansion radius (0=off)
 
+# Seconds a cached "does this conversation have messages" answer stays valid
+CONVERSATION_EXISTS_CACHE_TTL = float(os.getenv('CONVERSATION_EXISTS_CACHE_TTL', '10'))
+# Most (user, bot) entries each per-conversation cache keeps; the least recently used is dropped beyond this
+CONVERSATION_CACHE_MAX_ENTRIES = int(os.getenv('CONVERSATION_CACHE_MAX_ENTRIES', '1000'))
+# Seconds a fetched history window is reused (0 disables); local appends extend it, clears drop it.
+# Messages written by other processes (e.g. Celery proactive tasks) may be missing for up to this long.
+FORMATTED_HISTORY_CACHE_TTL = float(os.getenv('FORMATTED_HISTORY_CACHE_TTL', '10'))
+
+# Seconds a /clear request waits for its /ok confirmation before expiring
+CLEAR_CONFIRMATION_TIMEOUT = float(os.getenv('CLEAR_CONFIRMATION_TIMEOUT', '60'))
+# Most /clear confirmations kept pending at once; the oldest is dropped beyond this
+PENDING_CLEAR_MAX_ENTRIES = int(os.getenv('PENDING_CLEAR_MAX_ENTRIES', '10000'))
+
 # Typing Simulation Configuration
 MIN_TYPING_SPEED = int(os.getenv('MIN_TYPING_SPEED', '10'))  # characters per second
 MAX_TYPING_SPEED = int(os.getenv('MAX_TYPING_SPEED', '30'))  # characters per second
@@ -121,6 +161,13 @@ MESSAGE_QUEUE_MAX_RETRIES = int(os.getenv('MESSAGE_QUEUE_MAX_RETRIES', '3'))
 MESSAGE_QUEUE_LOCK_TIMEOUT = int(os.getenv('MESSAGE_QUEUE_LOCK_TIMEOUT', '30'))
 MESSAGE_QUEUE_LOCK_REFRESH_INTERVAL = int(os.getenv('MESSAGE_QUEUE_LOCK_REFRESH_INTERVAL', '10'))
 MESSAGE_QUEUE_DISPATCHER_INTERVAL = float(os.getenv('MESSAGE_QUEUE_DISPATCHER_INTERVAL', '0.1'))
+MESSAGE_QUEUE_PIPELINE_DEPTH = int(os.getenv('MESSAGE_QUEUE_PIPELINE_DEPTH', '32'))  # Redis commands per pipeline flush
+MESSAGE_QUEUE_SEND_RATE = float(os.getenv('MESSAGE_QUEUE_SEND_RATE', '30'))  # Dispatcher sends per second per bot token, 0 disables pacing
+
+# Outbound reply coalescing for direct sends (window of 0, the default, disables coalescing)
+OUTBOX_COALESCE_WINDOW = float(os.getenv('OUTBOX_COALESCE_WINDOW', '0'))  # seconds
+OUTBOX_IDLE_FLUSH = float(os.getenv('OUTBOX_IDLE_FLUSH', '0.1'))  # send once no reply has been queued for this long
+OUTBOX_MAX_PENDING = int(os.getenv('OUTBOX_MAX_PENDING', '5'))  # flush early at this many queued replies
 
 # Proactive messaging cadences
 PROACTIVE_MESSAGING_CADENCES = [
@@ -146,6 +193,10 @@ PROACTIVE_MESSAGING_MAX_RETRIES = int(os.getenv('PROACTIVE_MESSAGING_MAX_RETRIES
 # Rescheduling delay for proactive messaging restart (in seconds)
 PROACTIVE_MESSAGING_RESTART_DELAY_MAX = int(os.getenv('PROACTIVE_MESSAGING_RESTART_DELAY_MAX', '900'))  # 5 minutes
 
+# Batching of cadence resets triggered by user messages (interval of 0 notifies immediately)
+PROACTIVE_NOTIFY_FLUSH_INTERVAL = float(os.getenv('PROACTIVE_NOTIFY_FLUSH_INTERVAL', '0.05'))  # seconds
+PROACTIVE_NOTIFY_BATCH_SIZE = int(os.getenv('PROACTIVE_NOTIFY_BATCH_SIZE', '32'))  # flush early at this many users
+
 # Proactive message prompt
 PROACTIVE_MESSAGING_PROMPT = os.getenv('PROACTIVE_MESSAGING_PROMPT', (
     "Сгенерируй дружеское, заботливое сообщение, чтобы проверить, как у пользователя дела, на том языке, на котором ты обычно с ним разговариваешь. "
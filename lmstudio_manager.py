@@ -196,13 +196,16 @@ class LMStudioManager:
         try:
             logger.info("Ensuring model %s is loaded (auto_load=%s)", model_name, auto_load)
             
-            # First check if server is running
+            # Probe the model alongside the server check so a healthy start costs one round trip;
+            # a down server still returns after the short server-check timeout.
+            loaded_check = asyncio.ensure_future(self.is_model_loaded(model_name))
             if not await self.is_server_running():
+                loaded_check.cancel()
                 logger.error("LM Studio server is not running")
                 return False
 
             # Respect already-loaded models even when auto-load is disabled.
-            if await self.is_model_loaded(model_name):
+            if await loaded_check:
                 logger.info("Model %s is already loaded", model_name)
                 return True
             
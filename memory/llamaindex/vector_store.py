@@ -107,9 +107,10 @@ class PgVectorStore(VectorStoreAbstraction):
             result = await asyncio.to_thread(self._store.query, query_obj)
             logger.info(f"<== PGVectorStore query returned {len(result.nodes)} nodes")
 
-            for i, node in enumerate(result.nodes):
-                score = result.similarities[i] if result.similarities and i < len(result.similarities) else "N/A"
-                logger.debug(f"  Node {i+1} [Score: {score}]: {node.get_content()[:100]}... Metadata: {node.metadata}")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, node in enumerate(result.nodes):
+                    score = result.similarities[i] if result.similarities and i < len(result.similarities) else "N/A"
+                    logger.debug("  Node %d [Score: %s]: %s... Metadata: %s", i + 1, score, node.get_content()[:100], node.metadata)
 
             return result.nodes
         except Exception as e:
@@ -10,6 +10,7 @@ Includes:
 import logging
 from celery import Celery
 import asyncio
+from typing import Optional
 
 import redis
 from app_context import get_app_context
@@ -73,6 +74,14 @@ def create_conversation_summary(conversation_id: str):
         raise
 
 
+def _build_summary_prompt(existing_summary: Optional[str], messages) -> str:
+    """Format the summarization prompt for the given messages in a single pass."""
+    return SUMMARIZATION_PROMPT.format(
+        existing_summary=existing_summary or "This is the beginning of the conversation.",
+        text="\n".join(f"{msg.role}: {msg.content}" for msg in messages)
+    )
+
+
 async def create_conversation_summary_async(conversation_id: str):
     """
     Async implementation of the conversation summarization logic.
@@ -113,14 +122,8 @@ async def create_conversation_summary_async(conversation_id: str):
             # If only 1 message, use it
             messages_to_summarize = messages_to_summarize[:1]
 
-        # 4. Prepare the text for summarization
-        text_to_summarize = "\n".join([f"{msg.role}: {msg.content}" for msg in messages_to_summarize])
-
         # 4. Generate the new summary with error handling for context length
-        prompt = SUMMARIZATION_PROMPT.format(
-            existing_summary=conversation.summary or "This is the beginning of the conversation.",
-            text=text_to_summarize
-        )
+        prompt = _build_summary_prompt(conversation.summary, messages_to_summarize)
 
         try:
             new_summary = await ai_handler.get_response(prompt)
@@ -132,14 +135,10 @@ async def create_conversation_summary_async(conversation_id: str):
                 quarter_count = len(messages_to_summarize) // 4
                 if quarter_count > 0:
                     messages_to_summarize = messages_to_summarize[:quarter_count]
-                    text_to_summarize = "\n".join([f"{msg.role}: {msg.content}" for msg in messages_to_summarize])
                     logger.info(f"Retrying with oldest {len(messages_to_summarize)} messages for summarization")
 
                     # Retry with reduced context
-                    prompt = SUMMARIZATION_PROMPT.format(
-                        existing_summary=conversation.summary or "This is the beginning of the conversation.",
-                        text=text_to_summarize
-                    )
+                    prompt = _build_summary_prompt(conversation.summary, messages_to_summarize)
                     new_summary = await ai_handler.get_response(prompt)
                 else:
                     # If we can't reduce further, skip summarization for this conversation
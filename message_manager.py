@@ -5,9 +5,8 @@ import time
 import json
 import redis
 import uuid
-import traceback
 from datetime import datetime
-from config import MIN_TYPING_SPEED, MAX_TYPING_SPEED, MAX_DELAY, RANDOM_OFFSET_MIN, RANDOM_OFFSET_MAX, MESSAGE_QUEUE_MAX_RETRIES, MESSAGE_QUEUE_LOCK_TIMEOUT, MESSAGE_QUEUE_LOCK_REFRESH_INTERVAL, MESSAGE_QUEUE_DISPATCHER_INTERVAL
+from config import MIN_TYPING_SPEED, MAX_TYPING_SPEED, MAX_DELAY, RANDOM_OFFSET_MIN, RANDOM_OFFSET_MAX, MESSAGE_QUEUE_MAX_RETRIES, MESSAGE_QUEUE_LOCK_TIMEOUT, MESSAGE_QUEUE_LOCK_REFRESH_INTERVAL, MESSAGE_QUEUE_DISPATCHER_INTERVAL, MESSAGE_QUEUE_PIPELINE_DEPTH, MESSAGE_QUEUE_SEND_RATE
 import textwrap
 import re
 from typing import Dict, Set, Optional, Any, Hashable
@@ -17,6 +16,10 @@ from config import TELEGRAM_TOKEN
 
 logger = logging.getLogger(__name__)
 
+_EXCESS_NEWLINES_RE = re.compile(r'\n{3,}')
+_ELLIPSIS_AFTER_BLANK_RE = re.compile(r'\n{2,}\.\.\.')
+
+
 def clean_ai_response(text: str) -> str:
     """
     Clean and normalize text by:
@@ -27,7 +30,7 @@ def clean_ai_response(text: str) -> str:
     text = text.strip()
 
     # Reduce multiple consecutive newlines to double newlines
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    text = _EXCESS_NEWLINES_RE.sub('\n\n', text)
 
     # Remove leading/trailing whitespace from each line
     lines = text.split('\n')
@@ -35,7 +38,7 @@ def clean_ai_response(text: str) -> str:
     text = '\n'.join(cleaned_lines)
 
     # Additional cleanup for cases with remaining whitespace
-    text = re.sub(r'\n{2,}\.\.\.', '\n\n', text)
+    text = _ELLIPSIS_AFTER_BLANK_RE.sub('\n\n', text)
 
     return text
 
@@ -52,6 +55,36 @@ def _split_ai_response(text: str) -> list:
     return safe_parts
 
 
+class SendRateLimiter:
+    """Token bucket that paces outbound Telegram sends to a bot-wide rate."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Initialize the limiter.
+
+        Args:
+            rate: Sends allowed per second
+            burst: Tokens that may accumulate while idle (defaults to one second's worth)
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a send token is available and consume it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
 class TypingIndicatorManager:
     """Manages typing indicators for concurrent conversations"""
 
@@ -59,7 +92,9 @@ class TypingIndicatorManager:
         self._active_typing_tasks: Dict[Hashable, asyncio.Task] = {}
         self._typing_locks: Dict[Hashable, asyncio.Lock] = {}
         self._typing_chat_ids: Dict[Hashable, int] = {}
+        self._typing_started_at: Dict[Hashable, float] = {}
         self.typing_interval = 3.0  # Send typing action every 3 seconds
+        self.restart_debounce = 1.0  # Keep a loop started this recently instead of restarting it
 
     @staticmethod
     def _typing_key(chat_id: int, route_key: Optional[Hashable] = None) -> Hashable:
@@ -70,6 +105,12 @@ class TypingIndicatorManager:
         """Start typing indicator for a specific chat"""
         try:
             typing_key = self._typing_key(chat_id, route_key)
+            # A loop that just sent "typing" already covers this chat; restarting would resend it
+            task = self._active_typing_tasks.get(typing_key)
+            if (task is not None and not task.done() and
+                    time.monotonic() - self._typing_started_at.get(typing_key, 0.0) < self.restart_debounce):
+                return
+
             # Cancel any existing typing task for this chat
             await self.stop_typing(chat_id, route_key=route_key)
 
@@ -85,6 +126,7 @@ class TypingIndicatorManager:
                 )
                 self._active_typing_tasks[typing_key] = task
                 self._typing_chat_ids[typing_key] = chat_id
+                self._typing_started_at[typing_key] = time.monotonic()
                 logger.debug("Started typing indicator for chat %s route %s", chat_id, typing_key)
 
         except Exception as e:
@@ -105,6 +147,7 @@ class TypingIndicatorManager:
 
                 del self._active_typing_tasks[typing_key]
                 self._typing_chat_ids.pop(typing_key, None)
+                self._typing_started_at.pop(typing_key, None)
                 logger.debug("Stopped typing indicator for chat %s route %s", chat_id, typing_key)
 
         except Exception as e:
@@ -165,20 +208,24 @@ class TypingIndicatorManager:
         await self.stop_all_typing()
         self._typing_locks.clear()
         self._typing_chat_ids.clear()
+        self._typing_started_at.clear()
 
 
 class MessageQueueManager:
     """Manages message queuing to Redis lists per user to prevent parallel execution of send_ai_response."""
 
-    def __init__(self, redis_url: str):
+    def __init__(self, redis_url: str, pipeline_depth: int = MESSAGE_QUEUE_PIPELINE_DEPTH, redis_client: Optional[redis.Redis] = None):
         """
         Initialize the MessageQueueManager.
 
         Args:
             redis_url: Redis connection URL
+            pipeline_depth: Maximum number of buffered Redis commands per pipeline flush
+            redis_client: Existing client to share instead of opening a new connection pool
         """
+        self.pipeline_depth = max(1, pipeline_depth)
         try:
-            self.redis_client = redis.from_url(redis_url)
+            self.redis_client = redis_client if redis_client is not None else redis.from_url(redis_url)
             # Test the connection
             self.redis_client.ping()
             logger.info("MessageQueueManager initialized with Redis URL: %s", redis_url)
@@ -247,38 +294,37 @@ class MessageQueueManager:
                 logger.warning("No message parts to enqueue for user %s", user_id)
                 return
 
-            # Add user/bot route to active users set first
+            # Buffer every part in one pipeline so the enqueue costs a single round trip.
+            # The route is added to the active set after its parts so the dispatcher
+            # never observes an active route with an empty queue.
             routing_key = self._routing_key(user_id, bot_id)
-            self.redis_client.sadd("dispatcher:active_users", routing_key)
-
-            # Enqueue each part as a separate message
+            queue_key = self._queue_key(user_id, bot_id)
             total_parts = len(message_parts)
+            # Parts share everything but their text and index, so build the envelope once
+            message_data = {
+                "user_id": user_id,
+                "chat_id": chat_id,
+                "text": "",
+                "timestamp": datetime.utcnow().isoformat(),
+                "message_type": message_type,
+                "retry_count": 0,
+                "part_index": 0,
+                "total_parts": total_parts,
+                "bot_token": bot_token,
+                "bot_id": bot_id
+            }
+            pipe = self.redis_client.pipeline(transaction=False)
             for i, part_text in enumerate(message_parts):
-                # Create message payload for this part
-                message_data = {
-                    "user_id": user_id,
-                    "chat_id": chat_id,
-                    "text": part_text,
-                    "timestamp": datetime.utcnow().isoformat(),
-                    "message_type": message_type,
-                    "retry_count": 0,
-                    "part_index": i,
-                    "total_parts": total_parts,
-                    "bot_token": bot_token,
-                    "bot_id": bot_id
-                }
-
-                # Serialize message data
-                message_json = json.dumps(message_data, ensure_ascii=False)
+                message_data["text"] = part_text
+                message_data["part_index"] = i
+                pipe.rpush(queue_key, json.dumps(message_data, ensure_ascii=False))
+                if len(pipe) >= self.pipeline_depth:
+                    pipe.execute()
+            pipe.sadd("dispatcher:active_users", routing_key)
+            pipe.execute()
 
-                # Redis key for user's queue
-                queue_key = self._queue_key(user_id, bot_id)
-
-                # Add message to user's Redis list using RPUSH
-                result = self.redis_client.rpush(queue_key, message_json)
-
-                logger.info("Enqueued message part %d/%d for user %s (chat %s) of type %s. Queue position: %s",
-                           i + 1, total_parts, user_id, chat_id, message_type, result)
+            logger.info("Enqueued %d message part(s) for user %s (chat %s) of type %s",
+                       total_parts, user_id, chat_id, message_type)
 
             # For backward compatibility, if bot and typing_manager are provided, we can still call send_ai_response directly
             # This allows for a gradual migration
@@ -345,7 +391,7 @@ class MessageQueueManager:
 class MessageDispatcher:
     """Dispatches messages from Redis queues to send_ai_response function."""
 
-    def __init__(self, redis_url: str, max_retries: int = 3, lock_timeout: int = 30):
+    def __init__(self, redis_url: str, max_retries: int = 3, lock_timeout: int = 30, redis_client: Optional[redis.Redis] = None):
         """
         Initialize the MessageDispatcher.
 
@@ -353,9 +399,10 @@ class MessageDispatcher:
             redis_url: Redis connection URL
             max_retries: Maximum number of retries for failed messages
             lock_timeout: Timeout for distributed locks in seconds
+            redis_client: Existing client to share instead of opening a new connection pool
         """
         try:
-            self.redis_client = redis.from_url(redis_url)
+            self.redis_client = redis_client if redis_client is not None else redis.from_url(redis_url)
             # Test the connection
             self.redis_client.ping()
             logger.info("MessageDispatcher initialized with Redis URL: %s", redis_url)
@@ -366,6 +413,12 @@ class MessageDispatcher:
 
             # Initialize Telegram bot for sending messages
             self.bot = Bot(token=TELEGRAM_TOKEN)
+            # One Bot per custom token so its HTTP connection pool is reused across sends
+            self._bots_by_token: Dict[str, Bot] = {}
+            # Queued sends bypass PTB's rate limiter and Telegram limits each token separately,
+            # so every token gets its own bucket
+            self._send_limiters: Dict[str, SendRateLimiter] = {}
+            self.send_limiter = self._send_limiter_for(TELEGRAM_TOKEN)
             self.typing_manager = TypingIndicatorManager()
 
             # Unique identifier for this dispatcher instance
@@ -425,6 +478,15 @@ class MessageDispatcher:
             logger.error("Failed to initialize MessageDispatcher with Redis URL %s: %s", redis_url, e)
             raise
 
+    def _send_limiter_for(self, bot_token: Optional[str]) -> Optional[SendRateLimiter]:
+        """Return the send bucket for a bot token, creating it on first use (None when pacing is off)."""
+        if MESSAGE_QUEUE_SEND_RATE <= 0:
+            return None
+        limiter = self._send_limiters.get(bot_token)
+        if limiter is None:
+            limiter = self._send_limiters[bot_token] = SendRateLimiter(MESSAGE_QUEUE_SEND_RATE)
+        return limiter
+
     @staticmethod
     def _normalize_bot_key(bot_id: str = None) -> str:
         return bot_id or "default"
@@ -819,11 +881,15 @@ class MessageDispatcher:
             try:
                 # Use bot_token from message if available, otherwise fallback to dispatcher's bot
                 bot_to_use = self.bot
+                send_limiter = self.send_limiter
                 bot_token = message.get("bot_token")
 
                 if bot_token:
+                    send_limiter = self._send_limiter_for(bot_token)
                     try:
-                        bot_to_use = Bot(token=bot_token)
+                        bot_to_use = self._bots_by_token.get(bot_token)
+                        if bot_to_use is None:
+                            bot_to_use = self._bots_by_token[bot_token] = Bot(token=bot_token)
                     except Exception as e:
                         logger.error("Failed to create bot instance from token for user %s: %s", user_id, e)
                         return False
@@ -838,7 +904,8 @@ class MessageDispatcher:
                     bot=bot_to_use,
                     typing_manager=self.typing_manager,
                     is_first_message=is_first_message,
-                    route_key=self._routing_key(user_id, message.get("bot_id"))
+                    route_key=self._routing_key(user_id, message.get("bot_id")),
+                    send_limiter=send_limiter
                 )
 
             except (Forbidden, BadRequest) as e:
@@ -919,7 +986,7 @@ class MessageDispatcher:
             logger.error("Error while trying to disable proactive messaging in Redis for user %s bot %s: %s", user_id, bot_id, e)
 
 
-async def send_ai_response(chat_id: int, text: str, bot, typing_manager: 'TypingIndicatorManager' = None, is_first_message: bool = True, route_key: Optional[Hashable] = None):
+async def send_ai_response(chat_id: int, text: str, bot, typing_manager: 'TypingIndicatorManager' = None, is_first_message: bool = True, route_key: Optional[Hashable] = None, send_limiter: Optional[SendRateLimiter] = None):
     """
     Send an AI response, splitting long or multi-paragraph text into safe Telegram messages.
 
@@ -928,6 +995,7 @@ async def send_ai_response(chat_id: int, text: str, bot, typing_manager: 'Typing
     :param bot: Telegram bot instance
     :param typing_manager: TypingIndicatorManager instance (optional)
     :param is_first_message: Whether the first emitted message should skip the typing delay
+    :param send_limiter: Optional SendRateLimiter each part must pass before sending
     """
     message_parts = _split_ai_response(text)
     if not message_parts:
@@ -951,13 +1019,15 @@ async def send_ai_response(chat_id: int, text: str, bot, typing_manager: 'Typing
             else:
                 await asyncio.sleep(delay)
 
+        if send_limiter is not None:
+            await send_limiter.acquire()
+
         try:
             logger.info("Sending message to chat %s: '%s...'", chat_id, part_text[:50])
             await bot.send_message(chat_id=chat_id, text=part_text)
             logger.info("Successfully sent message to chat %s", chat_id)
         except Exception as e:
-            logger.error("Failed to send message to chat %s: %s", chat_id, e)
-            logger.error(traceback.format_exc())
+            logger.error("Failed to send message to chat %s: %s", chat_id, e, exc_info=True)
             raise
 
 
@@ -110,33 +110,26 @@ def build_application_for_bot(bot, token: str) -> Application:
     # Otherwise build manually
     from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
     from config import POLLING_INTERVAL
+    from bot import _COMMANDS
 
     app = Application.builder().token(token).build()
-    app.add_handler(MessageHandler(filters.ALL, bot._monitor_pending_clear), group=-1)
-
-    # Register handlers
-    app.add_handler(CommandHandler("start", bot.start_command))
-    app.add_handler(CommandHandler("help", bot.help_command))
-    app.add_handler(CommandHandler("clear", bot.clear_command))
-    app.add_handler(CommandHandler("ok", bot.ok_command))
-    app.add_handler(CommandHandler("stats", bot.stats_command))
-    app.add_handler(CommandHandler("debug", bot.debug_command))
-    app.add_handler(CommandHandler("status", bot.status_command))
-    app.add_handler(CommandHandler("personality", bot.personality_command))
-    app.add_handler(CommandHandler("stop", bot.stop_command))
-    app.add_handler(CommandHandler("reset", bot.reset_command))
-    app.add_handler(CommandHandler("ping", bot.ping_command))
-    app.add_handler(CommandHandler("deps", bot.deps_command))
+
+    # Text first: it is the most common update and never matches a command
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+
+    # Register handlers from the same command table the single-bot build uses
+    app.add_handlers([CommandHandler(command, getattr(bot, method)) for command, method in _COMMANDS])
 
     # Callback query handler
     app.add_handler(CallbackQueryHandler(bot.handle_callback_query))
 
-    # Message handlers
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, bot.handle_message))
+    # Media handlers
     app.add_handler(MessageHandler(filters.PHOTO, bot.handle_photo))
     app.add_handler(MessageHandler(filters.VOICE, bot.handle_voice))
 
     # Error handler
     app.add_error_handler(bot.error_handler)
 
+    # Buffered dispatch replies through the application's bot
+    bot.application = app
     return app
@@ -11,7 +11,7 @@ import random
 import re
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable
 from celery import Celery
 from celery.schedules import crontab
 import redis
@@ -392,6 +392,14 @@ class ProactiveMessagingService:
         """
         normalized_bot_id = self._normalize_bot_id(bot_id)
         user_state = self._get_user_state(user_id, bot_id=normalized_bot_id)
+        self._apply_cadence_reset(user_state, normalized_bot_id)
+        self._set_user_state(user_id, user_state, bot_id=normalized_bot_id)
+
+        logger.info(f"Reset cadence for user {user_id} to {CADENCE_LEVELS[0]}")
+
+    @staticmethod
+    def _apply_cadence_reset(user_state: dict, normalized_bot_id: Optional[str]) -> None:
+        """Put a user state back on the shortest cadence in place."""
         user_state.update({
             'cadence': CADENCE_LEVELS[0],
             'consecutive_outreaches': 0,
@@ -402,9 +410,6 @@ class ProactiveMessagingService:
             'is_active': True,
             'bot_id': normalized_bot_id or user_state.get('bot_id')
         })
-        self._set_user_state(user_id, user_state, bot_id=normalized_bot_id)
-
-        logger.info(f"Reset cadence for user {user_id} to {CADENCE_LEVELS[0]}")
 
     def update_user_reply_status(self, user_id: int, replied: bool = True, bot_id: Optional[uuid.UUID] = None):
         """
@@ -441,6 +446,33 @@ class ProactiveMessagingService:
         self.reset_cadence(user_id, bot_id=bot_id)
         logger.info(f"Handled user message for user {user_id}, cadence state reset.")
 
+    def handle_user_messages_bulk(self, user_ids: Iterable[int], bot_id: Optional[uuid.UUID] = None):
+        """
+        Reset cadence state for several users of one bot in two Redis round trips.
+
+        Args:
+            user_ids: Telegram user IDs that sent a message
+            bot_id: Bot the messages were sent to
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        normalized_bot_id = self._normalize_bot_id(bot_id)
+        keys = [self._state_key(user_id, normalized_bot_id) for user_id in user_ids]
+        try:
+            states = self.redis_client.mget(keys)
+        except Exception as e:
+            logger.error(f"Error getting user states for {len(keys)} users and bot {bot_id} from Redis: {e}")
+            states = [None] * len(keys)
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key, state_json in zip(keys, states):
+            user_state = self._deserialize_state(state_json)
+            self._apply_cadence_reset(user_state, normalized_bot_id)
+            pipe.set(key, self._serialize_state(user_state))
+        pipe.execute()
+        logger.info(f"Handled user messages for {len(user_ids)} users, cadence state reset.")
+
 # Initialize the service
 proactive_messaging_service = ProactiveMessagingService()
 
@@ -8,7 +8,8 @@ and proper token budgeting.
 
 import logging
 import math
-from typing import Dict, List, Any, Optional, Mapping, Tuple, Protocol
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Mapping, Tuple, Protocol, Union
 from uuid import UUID
 
 from storage.interfaces import MessageRepo, PersonaRepo, ConversationRepo, UserRepo, Message
@@ -20,6 +21,24 @@ import config
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class PromptAssemblerConfig:
+    """Immutable PromptAssembler settings."""
+    max_memory_items: int = 3
+    memory_token_budget_ratio: float = 0.4
+    truncation_length: int = 200
+    include_system_template: bool = True
+
+
+# Settings from the environment, shared by every assembler built without an explicit config
+PROMPT_ASSEMBLER_CONFIG = PromptAssemblerConfig(
+    max_memory_items=config.PROMPT_MAX_MEMORY_ITEMS,
+    memory_token_budget_ratio=config.PROMPT_MEMORY_TOKEN_BUDGET_RATIO,
+    truncation_length=config.PROMPT_TRUNCATION_LENGTH,
+    include_system_template=config.PROMPT_INCLUDE_SYSTEM_TEMPLATE,
+)
+
+
 class Tokenizer(Protocol):
     """Protocol for tokenizer implementations"""
 
@@ -108,7 +127,7 @@ class PromptAssembler:
         user_repo: UserRepo,
         persona_repo: Optional[PersonaRepo] = None,
         tokenizer: Optional[Tokenizer] = None,
-        config: Mapping[str, Any] = None
+        config: Union[PromptAssemblerConfig, Mapping[str, Any], None] = None
     ):
         """
         Initialize PromptAssembler.
@@ -120,7 +139,7 @@ class PromptAssembler:
             user_repo: Repository for user operations
             persona_repo: Optional repository for persona configurations
             tokenizer: Optional tokenizer for accurate token counting
-            config: Configuration dictionary with:
+            config: PromptAssemblerConfig or mapping with (defaults to PROMPT_ASSEMBLER_CONFIG):
                 - max_memory_items: Maximum memory items to include (default: 3)
                 - memory_token_budget_ratio: Ratio of history budget for memories (default: 0.4)
                 - truncation_length: Length for message truncation (default: 200)
@@ -134,11 +153,15 @@ class PromptAssembler:
         self.token_counter = TokenCounter(tokenizer)
 
         # Set default config values
-        self.config = dict(config or {})
-        self.max_memory_items = self.config.get("max_memory_items", 3)
-        self.memory_token_budget_ratio = self.config.get("memory_token_budget_ratio", 0.4)
-        self.truncation_length = self.config.get("truncation_length", 200)
-        self.include_system_template = self.config.get("include_system_template", True)
+        if config is None:
+            config = PROMPT_ASSEMBLER_CONFIG
+        elif not isinstance(config, PromptAssemblerConfig):
+            config = PromptAssemblerConfig(**config)
+        self.config = config
+        self.max_memory_items = config.max_memory_items
+        self.memory_token_budget_ratio = config.memory_token_budget_ratio
+        self.truncation_length = config.truncation_length
+        self.include_system_template = config.include_system_template
         self.personality = None  # Dynamic personality for multi-bot support
 
         logger.info(f"PromptAssembler initialized with max_memory_items={self.max_memory_items}")
@@ -260,7 +283,7 @@ class PromptAssembler:
             system_tokens = self.token_counter.count_tokens(personality_to_use)
             messages.append(system_message)
             token_counts["system_tokens"] += system_tokens
-            logger.debug(f"Added system template: {system_tokens} tokens")
+            logger.debug("Added system template: %s tokens", system_tokens)
 
         # 4. Add conversation summary if it exists
         if conversation and conversation.summary:
@@ -268,7 +291,7 @@ class PromptAssembler:
             summary_tokens = self.token_counter.count_tokens(summary_message["content"])
             messages.append(summary_message)
             token_counts["system_tokens"] += summary_tokens
-            logger.debug(f"Added conversation summary: {summary_tokens} tokens")
+            logger.debug("Added conversation summary: %s tokens", summary_tokens)
 
         # 5. Calculate memory token budget
         memory_budget = int(history_budget * self.memory_token_budget_ratio)
@@ -393,7 +416,7 @@ class PromptAssembler:
                 messages.append(history_message)
                 token_counts["history_tokens"] += message_tokens
 
-            logger.debug(f"Added {len(filtered_messages)} history messages: {token_counts['history_tokens']} tokens")
+            logger.debug("Added %d history messages: %s tokens", len(filtered_messages), token_counts['history_tokens'])
 
         except Exception as e:
             logger.warning(f"Failed to load conversation history: {e}")
@@ -413,7 +436,7 @@ class PromptAssembler:
                    f"total tokens: {metadata['total_tokens']}")
 
         if included_memory_ids:
-            logger.debug(f"Included memory IDs: {included_memory_ids}")
+            logger.debug("Included memory IDs: %s", included_memory_ids)
 
         return messages, metadata
 
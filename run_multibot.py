@@ -27,8 +27,11 @@ logger = logging.getLogger(__name__)
 async def main():
     """Main entry point for multi-bot system."""
     from admin_bot import AdminBot
+    from bot import install_default_executor
     from bot_manager import BotManager
 
+    install_default_executor()
+
     # Get configuration from environment
     admin_token = os.getenv('ADMIN_BOT_TOKEN')
     admin_user_ids_str = os.getenv('ADMIN_USER_IDS', '')
@@ -87,7 +90,7 @@ async def main():
         shutdown_event.set()
 
     # Register signal handlers
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
     for sig in (signal.SIGINT, signal.SIGTERM):
         try:
             loop.add_signal_handler(sig, signal_handler)
@@ -154,7 +157,15 @@ async def main():
 
 
 if __name__ == "__main__":
+    from bot import install_event_loop_policy, install_queue_logging
+
+    install_event_loop_policy()
+    # Handler I/O for every bot runs on the listener thread instead of the shared event loop
+    log_listener = install_queue_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Interrupted by user")
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
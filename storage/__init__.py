@@ -15,6 +15,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from sqlalchemy.pool import NullPool, QueuePool, StaticPool
 from sqlalchemy import text
 
+import config
 from .models import Base, PGVECTOR_AVAILABLE
 from .repos import (
     PostgresMessageRepo,
@@ -142,11 +143,16 @@ async def create_storage(db_url: str, use_pgvector: bool = True) -> Storage:
         else:
             # PostgreSQL with connection pooling - don't specify poolclass for async engines
             engine_kwargs.update({
-                "pool_size": 10,
-                "max_overflow": 20,
+                "pool_size": config.DB_POOL_SIZE,
+                "max_overflow": config.DB_MAX_OVERFLOW,
                 "pool_pre_ping": True,
-                "pool_recycle": 3600,  # 1 hour
+                "pool_recycle": config.DB_POOL_RECYCLE,
             })
+            if db_url.startswith('postgresql+asyncpg://'):
+                # Keep the parsed/planned hot queries per pooled connection
+                engine_kwargs["connect_args"] = {
+                    "prepared_statement_cache_size": config.DB_PREPARED_STATEMENT_CACHE_SIZE,
+                }
             logger.info("Using PostgreSQL with connection pooling")
 
         engine = create_async_engine(db_url, **engine_kwargs)
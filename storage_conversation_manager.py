@@ -5,24 +5,47 @@ This module provides a drop-in replacement for the in-memory ConversationManager
 while using the new PostgreSQL storage system for persistence and scalability.
 """
 
-import asyncio
 import logging
 import time
 import uuid
+from collections import OrderedDict
 from typing import List, Dict, Optional
 from uuid import UUID
 
-from config import MAX_CONVERSATION_HISTORY, PROMPT_REPLY_TOKEN_BUDGET, MAX_CONTEXT_TOKENS, RESERVED_TOKENS, AVAILABLE_HISTORY_TOKENS
+from config import MAX_CONVERSATION_HISTORY, PROMPT_REPLY_TOKEN_BUDGET, MAX_CONTEXT_TOKENS, RESERVED_TOKENS, AVAILABLE_HISTORY_TOKENS, CONVERSATION_EXISTS_CACHE_TTL, FORMATTED_HISTORY_CACHE_TTL, CONVERSATION_CACHE_MAX_ENTRIES
 from storage import create_storage, Storage
 from storage.interfaces import Message, Conversation, User, Persona, MessageLog, MessageUser
 
 logger = logging.getLogger(__name__)
 
 
+def _lru_get(cache: OrderedDict, key):
+    """Return a live cache entry and mark it recently used; expired entries are dropped."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if entry[-1] <= time.monotonic():
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return entry
+
+
+def _lru_put(cache: OrderedDict, key, entry) -> None:
+    """Store an entry whose last element is its expiry, evicting the least recently used beyond the cap."""
+    cache[key] = entry
+    cache.move_to_end(key)
+    while len(cache) > CONVERSATION_CACHE_MAX_ENTRIES:
+        cache.popitem(last=False)
+
+
 class PostgresConversationManager:
     """
     PostgreSQL-backed conversation manager that maintains the same interface as the original.
 
+    Every database operation is a coroutine; there are no sync wrappers, so nothing
+    here can block the event loop when called from a handler.
+
     This class provides seamless integration with existing bot code while adding:
     - Persistent storage across bot restarts
     - Scalable database backend
@@ -41,9 +64,12 @@ class PostgresConversationManager:
         self.db_url = db_url
         self.use_pgvector = use_pgvector
         self.storage: Optional[Storage] = None
+        self._owns_storage = True  # False when the storage (and its pool) is shared with other managers
         self._user_cache: Dict[int, User] = {}  # Cache for user objects
         self._conversation_cache: Dict[tuple[int, Optional[uuid.UUID]], Conversation] = {}  # Cache for conversation objects
         self._default_persona_cache: Dict[str, Persona] = {}  # Cache for default personas
+        self._message_count_cache: OrderedDict[tuple[int, Optional[uuid.UUID]], tuple[int, float]] = OrderedDict()  # (count, expires_at), LRU
+        self._formatted_cache: OrderedDict[tuple[int, Optional[uuid.UUID]], tuple[List[Dict], List[int], float]] = OrderedDict()  # (messages, token_counts, expires_at), LRU
 
         logger.info("PostgresConversationManager initialized. DB: %s, pgvector: %s",
                    self._mask_db_url(db_url), use_pgvector)
@@ -54,12 +80,19 @@ class PostgresConversationManager:
             self.storage = await create_storage(self.db_url, self.use_pgvector)
             logger.info("Storage connection initialized successfully")
 
+    def use_shared_storage(self, storage: Storage) -> None:
+        """Use an already initialized storage whose connection pool is owned by the caller."""
+        self.storage = storage
+        self._owns_storage = False
+        logger.info("Using shared storage connection pool")
+
     async def close(self):
-        """Close the storage connection."""
+        """Close the storage connection, or just release a shared one."""
         if self.storage:
-            await self.storage.close()
+            if self._owns_storage:
+                await self.storage.close()
+                logger.info("Storage connection closed")
             self.storage = None
-            logger.info("Storage connection closed")
 
     async def _ensure_user_and_conversation(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> Conversation:
         """
@@ -134,6 +167,33 @@ class PostgresConversationManager:
         """Get conversation history for a user (async version)."""
         return await self._get_conversation_async(user_id, bot_id=bot_id)
 
+    async def conversation_exists_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> bool:
+        """Check whether a user has any conversation messages without fetching them."""
+        return await self.get_message_count_async(user_id, bot_id=bot_id) > 0
+
+    async def get_message_count_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> int:
+        """
+        Count the messages in a user's conversation, cached briefly.
+
+        The cached value is dropped whenever this manager adds or clears messages.
+        Storage errors are logged and re-raised so callers never mistake them for
+        an empty conversation.
+        """
+        cache_key = (user_id, bot_id)
+        cached = _lru_get(self._message_count_cache, cache_key)
+        if cached is not None:
+            return cached[0]
+
+        try:
+            conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
+            count = await self.storage.messages.count_active_messages(str(conversation.id), None)
+        except Exception as e:
+            logger.error("Error counting messages for user %d: %s", user_id, e)
+            raise
+
+        _lru_put(self._message_count_cache, cache_key, (count, time.monotonic() + CONVERSATION_EXISTS_CACHE_TTL))
+        return count
+
     async def get_formatted_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> List[Dict]:
         """Get formatted conversation for AI API (async version)."""
         return await self._get_formatted_conversation_async(user_id, bot_id=bot_id)
@@ -146,9 +206,13 @@ class PostgresConversationManager:
         """Debug conversation state (async version)."""
         return await self._debug_conversation_state_async(user_id, bot_id=bot_id)
 
-    async def clear_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> None:
-        """Clear conversation history for a user (async version)."""
-        await self._clear_conversation_async(user_id, bot_id=bot_id)
+    async def get_conversation_summary_async(self, user_id: int) -> str:
+        """Get a summary of the conversation for context preservation."""
+        return await self._get_conversation_summary_async(user_id)
+
+    async def clear_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> int:
+        """Clear conversation history for a user and return the number of messages deleted."""
+        return await self._clear_conversation_async(user_id, bot_id=bot_id)
 
     async def save_message_to_history(self, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None) -> tuple[MessageLog, MessageUser]:
         """
@@ -190,25 +254,8 @@ class PostgresConversationManager:
 
         return await self.storage.message_history.get_user_history(user_uuid, limit, bot_id=bot_id)
 
-    def add_message(self, user_id: int, role: str, content: str) -> None:
-        """
-        Add a message to the user's conversation history (sync wrapper for async).
-
-        This method maintains compatibility with the existing sync interface.
-        """
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If we're in an async context, schedule the task
-                asyncio.create_task(self._add_message_async(user_id, role, content))
-            else:
-                # If not in async context, run it
-                asyncio.run(self._add_message_async(user_id, role, content))
-        except RuntimeError:
-            # No event loop, create one
-            asyncio.run(self._add_message_async(user_id, role, content))
-
-    async def add_message_async(self, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None) -> Message:
+    async def add_message_async(self, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None,
+                                conversation: Optional[Conversation] = None) -> Message:
         """
         Add a message to the user's conversation history (async version).
 
@@ -216,10 +263,13 @@ class PostgresConversationManager:
             user_id: Telegram user ID
             role: Message role ("user" or "assistant")
             content: Message content
+            conversation: Conversation already resolved earlier in the same turn, to skip looking it up again
 
         Returns:
             The created Message object
         """
+        if conversation is not None:
+            return await self._append_to_conversation(conversation, user_id, role, content, bot_id=bot_id)
         return await self._add_message_async(user_id, role, content, bot_id=bot_id)
 
     async def _add_message_async(self, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None) -> Message:
@@ -235,15 +285,20 @@ class PostgresConversationManager:
             The created Message object
         """
         conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
+        return await self._append_to_conversation(conversation, user_id, role, content, bot_id=bot_id)
 
+    async def _append_to_conversation(self, conversation: Conversation, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None) -> Message:
+        """Append a message to an already resolved conversation and mirror it to the history tables."""
         message = await self.storage.messages.append_message(
             conversation_id=str(conversation.id),
             role=role,
             content=content,
             extra_data={"telegram_user_id": user_id}
         )
+        self._message_count_cache.pop((user_id, bot_id), None)
+        self._extend_formatted_cache(user_id, bot_id, message)
 
-        # Also save to message history tables
+        # Mirror only what was stored, so the history tables never hold a message the conversation lacks
         try:
             await self.save_message_to_history(user_id, role, content, bot_id=bot_id)
         except Exception as e:
@@ -253,26 +308,29 @@ class PostgresConversationManager:
                    user_id, role, len(content))
         return message
 
-    def get_conversation(self, user_id: int) -> List[Dict]:
+    async def add_message_and_get_context_async(self, user_id: int, role: str, content: str, bot_id: Optional[uuid.UUID] = None) -> tuple[Conversation, List[Dict]]:
         """
-        Get the conversation history for a user (sync wrapper).
+        Add a message and return the conversation with its formatted history.
 
-        WARNING: This method should not be called from async contexts.
-        Use get_conversation_async() instead from async code.
+        The conversation is resolved once and reused for both the insert and the
+        history fetch, instead of once per call as with the separate methods.
+
+        Args:
+            user_id: Telegram user ID
+            role: Message role ("user" or "assistant")
+            content: Message content
+
+        Returns:
+            Tuple of (Conversation, messages formatted for the AI API)
         """
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                logger.error("get_conversation called from async context for user %d - use get_conversation_async() instead", user_id)
-                return []
-            else:
-                return asyncio.run(self._get_conversation_async(user_id))
-        except RuntimeError:
-            # No event loop, create one
-            return asyncio.run(self._get_conversation_async(user_id))
-        except Exception as e:
-            logger.error("Error in get_conversation for user %d: %s", user_id, e)
-            return []
+        conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
+        await self._append_to_conversation(conversation, user_id, role, content, bot_id=bot_id)
+        cached = self._cached_formatted(user_id, bot_id)
+        if cached is not None:
+            return conversation, cached
+        formatted_messages, token_counts = await self._format_recent_messages(conversation, user_id)
+        self._cache_formatted(user_id, bot_id, formatted_messages, token_counts)
+        return conversation, formatted_messages
 
     async def _get_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> List[Dict]:
         """
@@ -304,85 +362,118 @@ class PostgresConversationManager:
             logger.error("Error getting conversation for user %d: %s", user_id, e)
             return []
 
-    def clear_conversation(self, user_id: int) -> None:
-        """
-        Clear conversation history for a user (sync wrapper).
-        """
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                asyncio.create_task(self._clear_conversation_async(user_id))
-            else:
-                asyncio.run(self._clear_conversation_async(user_id))
-        except RuntimeError:
-            asyncio.run(self._clear_conversation_async(user_id))
-
-    async def _clear_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> None:
+    async def _clear_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> int:
         """
         Clear conversation history for a user by deleting all messages.
 
         Args:
             user_id: Telegram user ID
+
+        Returns:
+            Number of messages deleted from the conversation
+
+        Raises:
+            Exception: Any storage error, after logging it, so callers never mistake a failure for an empty history
         """
+        cache_key = (user_id, bot_id)
         try:
             # Get the current conversation to delete its messages
             conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
 
-            # Actually delete all messages from the database
-            deleted_count = await self.storage.messages.delete_messages(str(conversation.id))
+            try:
+                # Actually delete all messages from the database
+                deleted_count = await self.storage.messages.delete_messages(str(conversation.id))
+
+                # Message history is bot-aware now, including the default single-bot path.
+                user_uuid = uuid.uuid5(uuid.NAMESPACE_OID, f"telegram_user_{user_id}")
+                user_history_deleted_count = await self.storage.message_history.clear_user_history(
+                    user_uuid,
+                    bot_id=bot_id,
+                )
+            finally:
+                # Drop cached data even if only the history mirror failed, so deleted messages are never served
+                self._conversation_cache.pop(cache_key, None)
+                self._message_count_cache.pop(cache_key, None)
+                self._formatted_cache.pop(cache_key, None)
 
-            # Message history is bot-aware now, including the default single-bot path.
-            user_uuid = uuid.uuid5(uuid.NAMESPACE_OID, f"telegram_user_{user_id}")
-            user_history_deleted_count = await self.storage.message_history.clear_user_history(
-                user_uuid,
-                bot_id=bot_id,
-            )
             logger.info(
                 "Clear operation completed for user %d: %d messages deleted from conversation table, %d messages deleted from user history table",
                 user_id,
                 deleted_count,
                 user_history_deleted_count,
             )
-
-            # Remove from cache to clear any cached data
-            cache_key = (user_id, bot_id)
-            if cache_key in self._conversation_cache:
-                del self._conversation_cache[cache_key]
-
-            logger.info("Cleared conversation for user %d", user_id)
+            return deleted_count
 
         except Exception as e:
             logger.error("Error clearing conversation for user %d: %s", user_id, e)
+            raise
 
-    def get_formatted_conversation(self, user_id: int) -> List[Dict]:
+    async def _get_formatted_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> List[Dict]:
         """
-        Get conversation formatted for AI API with token management (sync wrapper).
+        Get conversation formatted for AI API with token management (async implementation).
+
+        Reads within FORMATTED_HISTORY_CACHE_TTL of the last fetch are served from memory;
+        messages this manager appends meanwhile are added to the cached window in place.
 
-        WARNING: This method should not be called from async contexts.
-        Use get_formatted_conversation_async() instead from async code.
+        Returns:
+            List of messages formatted for AI API within token budget
         """
+        cached = self._cached_formatted(user_id, bot_id)
+        if cached is not None:
+            return cached
+
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                logger.error("get_formatted_conversation called from async context for user %d - use get_formatted_conversation_async() instead", user_id)
-                return []
-            else:
-                return asyncio.run(self._get_formatted_conversation_async(user_id))
-        except RuntimeError:
-            return asyncio.run(self._get_formatted_conversation_async(user_id))
+            conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
         except Exception as e:
-            logger.error("Error in get_formatted_conversation for user %d: %s", user_id, e)
+            logger.error("Error formatting conversation for user %d: %s", user_id, e)
             return []
+        formatted_messages, token_counts = await self._format_recent_messages(conversation, user_id)
+        self._cache_formatted(user_id, bot_id, formatted_messages, token_counts)
+        return formatted_messages
 
-    async def _get_formatted_conversation_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> List[Dict]:
+    def _cached_formatted(self, user_id: int, bot_id: Optional[uuid.UUID]) -> Optional[List[Dict]]:
+        """Return a copy of the cached history window, or None when absent or expired."""
+        cached = _lru_get(self._formatted_cache, (user_id, bot_id))
+        if cached is not None:
+            return list(cached[0])
+        return None
+
+    def _cache_formatted(self, user_id: int, bot_id: Optional[uuid.UUID], formatted_messages: List[Dict], token_counts: List[int]) -> None:
+        """Remember a freshly fetched history window for later reads."""
+        if FORMATTED_HISTORY_CACHE_TTL > 0 and formatted_messages:
+            _lru_put(self._formatted_cache, (user_id, bot_id), (
+                list(formatted_messages), list(token_counts), time.monotonic() + FORMATTED_HISTORY_CACHE_TTL
+            ))
+
+    def _extend_formatted_cache(self, user_id: int, bot_id: Optional[uuid.UUID], message: Message) -> None:
         """
-        Get conversation formatted for AI API with token management (async implementation).
+        Add a just-stored message to the cached window instead of refetching the history.
 
-        Returns:
-            List of messages formatted for AI API within token budget
+        Only writes made through this manager reach the window. Messages stored by other
+        processes (the Celery proactive and memory tasks) stay invisible until the entry
+        expires, so reads may lag them by up to FORMATTED_HISTORY_CACHE_TTL seconds.
         """
+        cache_key = (user_id, bot_id)
+        cached = self._formatted_cache.get(cache_key)
+        if not cached or cached[2] <= time.monotonic():
+            self._formatted_cache.pop(cache_key, None)
+            return
+
+        messages, token_counts, _ = cached
+        messages.append({"role": message.role, "content": message.content})
+        token_counts.append(message.token_count)
+        # Same rule as fetch_recent_messages: keep the newest messages until one no longer fits
+        start = len(token_counts)
+        total = 0
+        while start > 0 and total + token_counts[start - 1] <= AVAILABLE_HISTORY_TOKENS:
+            start -= 1
+            total += token_counts[start]
+        del messages[:start]
+        del token_counts[:start]
+
+    async def _format_recent_messages(self, conversation: Conversation, user_id: int) -> tuple[List[Dict], List[int]]:
+        """Fetch the most recent messages within the history token budget in AI API format, with their token counts."""
         try:
-            conversation = await self._ensure_user_and_conversation(user_id, bot_id=bot_id)
             messages = await self.storage.messages.fetch_recent_messages(
                 str(conversation.id),
                 token_budget=AVAILABLE_HISTORY_TOKENS
@@ -396,35 +487,15 @@ class PostgresConversationManager:
                     "content": msg.content
                 })
 
+            token_counts = [msg.token_count for msg in messages]
             logger.info("Formatted %d messages for user %d using %d tokens",
-                       len(formatted_messages), user_id,
-                       sum(msg.token_count for msg in messages))
+                       len(formatted_messages), user_id, sum(token_counts))
 
-            return formatted_messages
+            return formatted_messages, token_counts
 
         except Exception as e:
             logger.error("Error formatting conversation for user %d: %s", user_id, e)
-            return []
-
-    def get_user_stats(self, user_id: int) -> Dict:
-        """
-        Get statistics about user's conversation (sync wrapper).
-
-        WARNING: This method should not be called from async contexts.
-        Use get_user_stats_async() instead from async code.
-        """
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                logger.error("get_user_stats called from async context for user %d - use get_user_stats_async() instead", user_id)
-                return {"total_messages": 0, "user_messages": 0, "bot_messages": 0, "estimated_tokens": 0}
-            else:
-                return asyncio.run(self._get_user_stats_async(user_id))
-        except RuntimeError:
-            return asyncio.run(self._get_user_stats_async(user_id))
-        except Exception as e:
-            logger.error("Error in get_user_stats for user %d: %s", user_id, e)
-            return {"total_messages": 0, "user_messages": 0, "bot_messages": 0, "estimated_tokens": 0}
+            return [], []
 
     async def _get_user_stats_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> Dict:
         """
@@ -469,12 +540,6 @@ class PostgresConversationManager:
                 "last_message": None
             }
 
-    def get_conversation_summary(self, user_id: int) -> str:
-        """
-        Get a summary of the conversation for context preservation (sync wrapper).
-        """
-        return asyncio.run(self._get_conversation_summary_async(user_id))
-
     async def _get_conversation_summary_async(self, user_id: int) -> str:
         """
         Get a summary of the conversation for context preservation (async implementation).
@@ -499,44 +564,6 @@ class PostgresConversationManager:
             logger.error("Error getting conversation summary for user %d: %s", user_id, e)
             return "Error retrieving conversation summary."
 
-    def debug_conversation_state(self, user_id: int) -> Dict:
-        """
-        Debug method to show current conversation state (sync wrapper).
-
-        WARNING: This method should not be called from async contexts.
-        Use debug_conversation_state_async() instead from async code.
-        """
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                logger.error("debug_conversation_state called from async context for user %d - use debug_conversation_state_async() instead", user_id)
-                return {
-                    "raw_conversation_length": 0,
-                    "formatted_conversation_length": 0,
-                    "raw_tokens": 0,
-                    "formatted_tokens": 0,
-                    "max_context_tokens": MAX_CONTEXT_TOKENS,
-                    "available_history_tokens": AVAILABLE_HISTORY_TOKENS,
-                    "last_messages": [],
-                    "formatted_messages": []
-                }
-            else:
-                return asyncio.run(self._debug_conversation_state_async(user_id))
-        except RuntimeError:
-            return asyncio.run(self._debug_conversation_state_async(user_id))
-        except Exception as e:
-            logger.error("Error in debug_conversation_state for user %d: %s", user_id, e)
-            return {
-                "raw_conversation_length": 0,
-                "formatted_conversation_length": 0,
-                "raw_tokens": 0,
-                "formatted_tokens": 0,
-                "max_context_tokens": MAX_CONTEXT_TOKENS,
-                "available_history_tokens": AVAILABLE_HISTORY_TOKENS,
-                "last_messages": [],
-                "formatted_messages": []
-            }
-
     async def _debug_conversation_state_async(self, user_id: int, bot_id: Optional[uuid.UUID] = None) -> Dict:
         """
         Debug method to show current conversation state (async implementation).
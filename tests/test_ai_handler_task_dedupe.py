@@ -1,3 +1,6 @@
+import asyncio
+import threading
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
@@ -26,3 +29,92 @@ async def test_generate_response_skips_duplicate_summary_scheduling():
 
     assert response == "response"
     create_conversation_summary.delay.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_requests_cap_concurrent_calls():
+    with patch("ai_handler.ModelClient"), patch("ai_handler.AI_MAX_CONCURRENCY", 2):
+        handler = AIHandler()
+
+    in_flight = 0
+    peak = 0
+    guard = threading.Lock()
+
+    def ask(messages):
+        nonlocal in_flight, peak
+        with guard:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with guard:
+            in_flight -= 1
+        return "ok"
+
+    handler.model_client.ask = ask
+
+    results = await asyncio.gather(*(handler._request_with_timeout([]) for _ in range(6)))
+
+    assert results == ["ok"] * 6
+    assert peak <= 2
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_a_request_slot_does_not_count_against_the_timeout():
+    with patch("ai_handler.ModelClient"), patch("ai_handler.AI_MAX_CONCURRENCY", 1):
+        handler = AIHandler()
+    handler.request_timeout = 0.1
+
+    def ask(messages):
+        time.sleep(0.06)
+        return "ok"
+
+    handler.model_client.ask = ask
+
+    # The second call queues for ~0.06s and then runs ~0.06s, which together exceed the timeout
+    assert await asyncio.gather(handler._request_with_timeout([]), handler._request_with_timeout([])) == ["ok", "ok"]
+
+
+@pytest.mark.asyncio
+async def test_timed_out_request_holds_its_slot_until_the_call_returns():
+    with patch("ai_handler.ModelClient"), patch("ai_handler.AI_MAX_CONCURRENCY", 1):
+        handler = AIHandler()
+    handler.request_timeout = 0.02
+    finished = threading.Event()
+
+    def ask(messages):
+        time.sleep(0.1)
+        finished.set()
+        return "late"
+
+    handler.model_client.ask = ask
+
+    with pytest.raises(asyncio.TimeoutError):
+        await handler._request_with_timeout([])
+
+    assert finished.is_set()
+    assert not handler._request_semaphore.locked()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_retries_only_retryable_errors():
+    with patch("ai_handler.ModelClient"):
+        handler = AIHandler()
+    handler.base_delay = 0
+
+    handler._make_ai_request = AsyncMock(side_effect=[RuntimeError("HTTP 429 Too Many Requests"), "recovered"])
+    assert await handler.generate_response("hi", []) == "recovered"
+    assert handler._make_ai_request.await_count == 2
+
+    handler._make_ai_request = AsyncMock(side_effect=ValueError("invalid api key"))
+    assert await handler.generate_response("hi", []) is None
+    handler._make_ai_request.assert_awaited_once()
+
+
+def test_generate_greeting_formats_named_template():
+    with patch("ai_handler.ModelClient"):
+        handler = AIHandler()
+    handler._rng = MagicMock()
+    handler._rng.choice.side_effect = lambda templates: templates[0]
+
+    assert handler.generate_greeting("Ann") == "Hey Ann! 💕 How are you doing today?"
+    assert handler.generate_greeting() == "Hey there! 💕 How are you doing today?"
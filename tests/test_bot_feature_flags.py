@@ -1,11 +1,15 @@
+import asyncio
 import os
+import threading
+import time
 import uuid
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from bot import AIGirlfriendBot
+from bot import AIGirlfriendBot, _SETTINGS_TEXT
+from buffer_manager import BufferManager
 from features import BotFeature, DEFAULT_FEATURE_FLAGS, has_feature, get_enabled_features
 
 
@@ -23,7 +27,9 @@ def bot_instance():
              patch("bot.BufferManager") as mock_buffer_manager:
             conversation_manager = MagicMock()
             conversation_manager.get_conversation_async = AsyncMock()
-            conversation_manager.clear_conversation_async = AsyncMock()
+            conversation_manager.conversation_exists_async = AsyncMock(return_value=False)
+            conversation_manager.get_message_count_async = AsyncMock(return_value=0)
+            conversation_manager.clear_conversation_async = AsyncMock(return_value=0)
             conversation_manager.add_message_async = AsyncMock()
             conversation_manager.get_formatted_conversation_async = AsyncMock(return_value=[])
             conversation_manager._ensure_user_and_conversation = AsyncMock()
@@ -47,17 +53,18 @@ def bot_instance():
             bot.buffer_manager = buffer_manager
             bot.ai_handler = mock_ai_handler.return_value
             bot.proactive_messaging_service = None
+            bot._initialize_memory_components = AsyncMock()
             yield bot
 
 
 @pytest.mark.asyncio
 async def test_ok_command_clears_memories_for_current_bot(bot_instance):
     user_id = 12345
-    bot_instance.pending_clear_confirmation.add(user_id)
-    bot_instance.conversation_manager.get_conversation_async = AsyncMock(return_value=["msg"])
-    bot_instance.conversation_manager.clear_conversation_async = AsyncMock()
+    bot_instance.pending_clear_confirmation[user_id] = time.monotonic() + 60
+    bot_instance.conversation_manager.clear_conversation_async = AsyncMock(return_value=4)
     bot_instance.memory_manager = MagicMock()
     bot_instance.memory_manager.clear_memories = AsyncMock()
+    bot_instance._memory_initialized = True
 
     update = MagicMock()
     update.effective_user.id = user_id
@@ -73,6 +80,101 @@ async def test_ok_command_clears_memories_for_current_bot(bot_instance):
         str(user_id),
         bot_id=str(bot_instance.bot_id),
     )
+    bot_instance.conversation_manager.conversation_exists_async.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ok_command_confirms_clear_when_memory_build_fails(bot_instance):
+    user_id = 12345
+    bot_instance.pending_clear_confirmation[user_id] = time.monotonic() + 60
+    bot_instance.conversation_manager.clear_conversation_async = AsyncMock(return_value=4)
+    bot_instance._initialize_memory_components = AsyncMock(side_effect=RuntimeError("embedding model down"))
+
+    update = MagicMock()
+    update.effective_user.id = user_id
+    update.message.reply_text = AsyncMock()
+
+    with patch("bot.MEMORY_ENABLED", True):
+        await bot_instance.ok_command(update, MagicMock())
+
+    update.message.reply_text.assert_awaited_once_with("✨ Our conversation history has been permanently deleted. 💕")
+
+
+@pytest.mark.asyncio
+async def test_reply_is_sent_without_memory_when_memory_build_fails(bot_instance):
+    bot_instance.conversation_manager.add_message_and_get_context_async = AsyncMock(return_value=(SimpleNamespace(id="conv-1"), []))
+    bot_instance._initialize_memory_components = AsyncMock(side_effect=RuntimeError("embedding model down"))
+    bot_instance.message_queue_manager = None
+    bot_instance._queue_outbound = AsyncMock()
+
+    with patch("bot.MEMORY_ENABLED", True), \
+         patch("bot.generate_ai_response", new=AsyncMock(return_value="hello there")):
+        await bot_instance._generate_and_send_response(12345, 67890, MagicMock(), "hi")
+
+    bot_instance._queue_outbound.assert_awaited_once()
+    assert bot_instance._queue_outbound.await_args.args[3] == "hello there"
+
+
+@pytest.mark.asyncio
+async def test_ok_command_rejects_expired_clear_confirmation(bot_instance):
+    user_id = 12345
+    bot_instance.pending_clear_confirmation[user_id] = time.monotonic() - 1
+    bot_instance.conversation_manager.clear_conversation_async = AsyncMock()
+
+    update = MagicMock()
+    update.effective_user.id = user_id
+    update.effective_chat.id = 67890
+    update.message.reply_text = AsyncMock()
+
+    context = MagicMock()
+    context.bot.send_chat_action = AsyncMock()
+
+    await bot_instance.ok_command(update, context)
+
+    bot_instance.conversation_manager.clear_conversation_async.assert_not_called()
+    assert user_id not in bot_instance.pending_clear_confirmation
+    update.message.reply_text.assert_awaited_once_with("❌ There is no pending clear request. Send /clear first.")
+
+
+@pytest.mark.asyncio
+async def test_next_text_message_cancels_pending_clear(bot_instance):
+    bot_instance.pending_clear_confirmation[12345] = time.monotonic() + 60
+    bot_instance.pending_clear_confirmation[99999] = time.monotonic() + 60
+
+    update = MagicMock()
+    update.effective_user.id = 12345
+    update.effective_chat.id = 67890
+    update.message.text = "never mind"
+    update.message.reply_text = AsyncMock()
+
+    await bot_instance.handle_message(update, MagicMock())
+
+    assert 12345 not in bot_instance.pending_clear_confirmation
+    assert 99999 in bot_instance.pending_clear_confirmation
+    update.message.reply_text.assert_awaited_once_with(
+        "❌ Clear cancelled. To clear history, send /clear and then /ok."
+    )
+    bot_instance.buffer_manager.add_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_reset_command_reports_clear_from_deleted_count(bot_instance):
+    bot_instance.conversation_manager.clear_conversation_async = AsyncMock(return_value=3)
+
+    update = MagicMock()
+    update.effective_user.id = 12345
+    update.effective_user.first_name = "Ann"
+    update.effective_chat.id = 67890
+    update.message.reply_text = AsyncMock()
+
+    context = MagicMock()
+    context.bot.send_chat_action = AsyncMock()
+
+    await bot_instance.reset_command(update, context)
+
+    bot_instance.conversation_manager.conversation_exists_async.assert_not_called()
+    reply = update.message.reply_text.await_args.args[0]
+    assert "Conversation history cleared!" in reply
 
 
 @pytest.mark.asyncio
@@ -119,6 +221,19 @@ async def test_handle_message_bypasses_buffer_when_feature_disabled(bot_instance
     bot_instance.buffer_manager.schedule_dispatch.assert_not_called()
 
 
+@pytest.mark.asyncio
+async def test_handle_message_ignores_updates_without_text(bot_instance):
+    update = MagicMock()
+    update.effective_user.id = 12345
+    update.effective_chat.id = 67890
+    update.message = None
+
+    await bot_instance.handle_message(update, MagicMock())
+
+    bot_instance.buffer_manager.add_message.assert_not_called()
+    assert not bot_instance._chat_ids
+
+
 @pytest.mark.asyncio
 async def test_handle_message_uses_bot_scoped_buffer_route(bot_instance):
     route_bot_id = uuid.uuid4()
@@ -135,12 +250,84 @@ async def test_handle_message_uses_bot_scoped_buffer_route(bot_instance):
     await bot_instance.handle_message(update, context)
 
     expected_route = f"12345:{route_bot_id}"
-    assert expected_route in bot_instance.user_chat_context
+    assert bot_instance._chat_ids[expected_route] == update.effective_chat.id
     bot_instance.buffer_manager.set_user_context.assert_called_once_with(expected_route, context.bot, 67890)
     bot_instance.buffer_manager.add_message.assert_awaited_once_with(expected_route, "hello")
     bot_instance.buffer_manager.schedule_dispatch.assert_awaited_once_with(expected_route, bot_instance._dispatch_buffered_message)
 
 
+@pytest.mark.asyncio
+async def test_queued_replies_for_same_route_are_coalesced(bot_instance):
+    bot = MagicMock()
+
+    with patch("bot.OUTBOX_COALESCE_WINDOW", 0.2), \
+         patch("bot.send_ai_response", new_callable=AsyncMock) as send_ai_response:
+        await bot_instance._queue_outbound(12345, 67890, bot, "first")
+        await bot_instance._queue_outbound(12345, 67890, bot, "second")
+        await bot_instance._outbox_tasks[bot_instance._buffer_route_key(12345)]
+
+    send_ai_response.assert_awaited_once()
+    assert send_ai_response.await_args.kwargs["text"] == "first\n\nsecond"
+    assert bot_instance._outbox == {}
+    assert bot_instance._outbox_tasks == {}
+
+
+@pytest.mark.asyncio
+async def test_queued_replies_to_different_users_in_a_group_stay_separate(bot_instance):
+    bot = MagicMock()
+
+    with patch("bot.OUTBOX_COALESCE_WINDOW", 0.2), \
+         patch("bot.send_ai_response", new_callable=AsyncMock) as send_ai_response:
+        await bot_instance._queue_outbound(1, 67890, bot, "to one")
+        await bot_instance._queue_outbound(2, 67890, bot, "to two")
+        await asyncio.gather(*list(bot_instance._outbox_tasks.values()))
+
+    sent = {call.kwargs["route_key"]: call.kwargs["text"] for call in send_ai_response.await_args_list}
+    assert sent == {bot_instance._buffer_route_key(1): "to one", bot_instance._buffer_route_key(2): "to two"}
+
+
+@pytest.mark.asyncio
+async def test_queued_reply_flushes_once_idle(bot_instance):
+    bot = MagicMock()
+
+    with patch("bot.OUTBOX_COALESCE_WINDOW", 5), \
+         patch("bot.OUTBOX_IDLE_FLUSH", 0.01), \
+         patch("bot.send_ai_response", new_callable=AsyncMock) as send_ai_response:
+        await bot_instance._queue_outbound(12345, 67890, bot, "only")
+        await asyncio.wait_for(bot_instance._outbox_tasks[bot_instance._buffer_route_key(12345)], timeout=1)
+
+    send_ai_response.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_debug_command_lists_raw_and_formatted_messages(bot_instance):
+    bot_instance.bot_name = "Ava"
+    bot_instance.conversation_manager.debug_conversation_state_async = AsyncMock(return_value={
+        "raw_conversation_length": 2,
+        "formatted_conversation_length": 2,
+        "raw_tokens": 10,
+        "formatted_tokens": 10,
+        "max_context_tokens": 100,
+        "available_history_tokens": 80,
+        "last_messages": [{"role": "user", "content": "hi_there"}, {"role": "assistant", "content": "hello"}],
+        "formatted_messages": [{"role": "assistant", "content": "hello"}],
+    })
+
+    update = MagicMock()
+    update.effective_user.id = 12345
+    update.message.reply_text = AsyncMock()
+    context = MagicMock()
+    context.bot.send_chat_action = AsyncMock()
+
+    await bot_instance.debug_command(update, context)
+
+    text = update.message.reply_text.await_args.args[0]
+    assert "Raw messages: 2" in text
+    assert "\n1. 👤 You: hi_there\n2. 🤖 Ava: hello\n\n🤖 Last 5 Formatted Messages (sent to AI):\n1. 🤖 Ava: hello" in text
+    assert update.message.reply_text.await_args.kwargs == {}
+    bot_instance.conversation_manager.get_conversation_async.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_memory_extraction_skips_duplicate_scheduling(bot_instance):
     conversation = SimpleNamespace(last_memorized_message_id=None)
@@ -173,7 +360,245 @@ async def test_settings_callback_respects_feature_flag(bot_instance):
     query.edit_message_text.assert_awaited_once_with("❌ User settings are disabled for this bot.")
 
 
+@pytest.mark.asyncio
+async def test_settings_callback_sends_shared_text(bot_instance):
+    bot_instance.bot_config.feature_flags[BotFeature.USER_SETTINGS.value] = True
+
+    query = MagicMock()
+    query.data = "settings"
+    query.answer = AsyncMock()
+    query.edit_message_text = AsyncMock()
+
+    update = MagicMock()
+    update.callback_query = query
+
+    await bot_instance.handle_callback_query(update, MagicMock())
+
+    query.edit_message_text.assert_awaited_once_with(_SETTINGS_TEXT)
+
+
+@pytest.mark.asyncio
+async def test_personality_callback_updates_ai_personality(bot_instance):
+    bot_instance.bot_name = "Ava"
+
+    query = MagicMock()
+    query.data = "personality_cheerful"
+    query.from_user.id = 12345
+    query.answer = AsyncMock()
+    query.edit_message_text = AsyncMock()
+
+    update = MagicMock()
+    update.callback_query = query
+
+    await bot_instance.handle_callback_query(update, MagicMock())
+
+    prompt = bot_instance.ai_handler.update_personality.call_args.args[0]
+    assert prompt.startswith("You are Ava, a cheerful and energetic AI companion.")
+    query.edit_message_text.assert_awaited_once()
+
+
 def test_feature_helpers_handle_missing_flag_dict():
     assert has_feature(None, BotFeature.MEMORY) is True
     enabled = get_enabled_features(None)
     assert BotFeature.MEMORY in enabled
+
+
+@pytest.mark.asyncio
+async def test_post_init_initializes_and_starts_dispatcher_on_running_loop(bot_instance):
+    bot_instance._initialize_storage = AsyncMock()
+    bot_instance._initialize_memory_components = AsyncMock()
+    bot_instance._initialize_lmstudio_model = AsyncMock()
+    bot_instance.message_dispatcher = MagicMock()
+    bot_instance.message_dispatcher.start_dispatching = AsyncMock()
+
+    with patch("bot.EXECUTOR_MAX_WORKERS", 3):
+        await bot_instance._post_init(MagicMock())
+    await bot_instance.dispatcher_task
+    executor_thread = await asyncio.get_running_loop().run_in_executor(
+        None, lambda: threading.current_thread().name
+    )
+
+    bot_instance._initialize_storage.assert_awaited_once()
+    bot_instance._initialize_memory_components.assert_not_awaited()
+    bot_instance._initialize_lmstudio_model.assert_awaited_once()
+    bot_instance.message_dispatcher.start_dispatching.assert_awaited_once()
+    assert executor_thread.startswith("bot-executor")
+
+
+@pytest.mark.asyncio
+async def test_memory_components_are_built_once_on_first_use(bot_instance):
+    async def initialize():
+        await asyncio.sleep(0)
+        bot_instance._memory_initialized = True
+
+    bot_instance._initialize_memory_components = AsyncMock(side_effect=initialize)
+
+    with patch("bot.MEMORY_ENABLED", True):
+        results = await asyncio.gather(*(bot_instance._ensure_memory_components() for _ in range(3)))
+
+    assert results == [True, True, True]
+    bot_instance._initialize_memory_components.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_storage_initialization_connects_once(bot_instance):
+    async def initialize():
+        await asyncio.sleep(0)
+
+    bot_instance.conversation_manager.initialize = AsyncMock(side_effect=initialize)
+
+    await asyncio.gather(*(bot_instance._initialize_storage() for _ in range(3)))
+    await bot_instance._initialize_storage()
+
+    bot_instance.conversation_manager.initialize.assert_awaited_once()
+    assert bot_instance._storage_initialized
+
+
+@pytest.mark.asyncio
+async def test_message_during_a_turn_is_answered_after_it(bot_instance):
+    bot_instance.buffer_manager = BufferManager()
+    bot_instance.application = MagicMock()
+    first_started = asyncio.Event()
+    finish_first = asyncio.Event()
+    answered = []
+
+    async def generate(user_id, chat_id, bot, user_message):
+        if not answered:
+            first_started.set()
+            await finish_first.wait()
+        answered.append(user_message)
+
+    bot_instance._generate_and_send_response = AsyncMock(side_effect=generate)
+
+    def message_update(text):
+        update = MagicMock()
+        update.effective_user.id = 12345
+        update.effective_chat.id = 67890
+        update.message.text = text
+        return update
+
+    with patch("buffer_manager.BUFFER_SHORT_MESSAGE_TIMEOUT", 0.01), \
+         patch("buffer_manager.BUFFER_LONG_MESSAGE_TIMEOUT", 0.01):
+        await bot_instance.handle_message(message_update("first"), MagicMock())
+        await asyncio.wait_for(first_started.wait(), timeout=1)
+
+        # Arrives while the first turn is still generating; it must neither cancel nor join that turn
+        await bot_instance.handle_message(message_update("second"), MagicMock())
+        await asyncio.sleep(0.05)
+        finish_first.set()
+
+        for _ in range(100):
+            if len(answered) == 2:
+                break
+            await asyncio.sleep(0.01)
+        await bot_instance.buffer_manager.stop()
+
+    assert answered == ["first", "second"]
+
+
+def test_build_application_registers_all_commands(bot_instance):
+    from telegram.ext import CommandHandler
+
+    application = bot_instance.build_application(token_override="123:token")
+
+    commands = set()
+    for handler in application.handlers[0]:
+        if isinstance(handler, CommandHandler):
+            commands |= handler.commands
+    assert {"start", "help", "clear", "ok", "stop", "deps"} <= commands
+    assert list(application.handlers) == [0]
+    assert bot_instance.application is application
+
+
+@pytest.mark.asyncio
+async def test_status_command_reports_even_when_memory_probe_fails(bot_instance):
+    bot_instance.conversation_manager.get_user_stats_async = AsyncMock(return_value={
+        "total_messages": 3, "user_messages": 2, "bot_messages": 1,
+    })
+    bot_instance._ensure_memory_components = AsyncMock(side_effect=RuntimeError("redis down"))
+
+    update = MagicMock()
+    update.effective_user.id = 12345
+    update.message.reply_text = AsyncMock()
+
+    await bot_instance.status_command(update, MagicMock())
+
+    bot_instance._ensure_memory_components.assert_awaited_once()
+    text = update.message.reply_text.await_args.args[0]
+    assert "Total messages: 3" in text
+
+
+def test_pending_clear_drops_expired_and_overflow_entries(bot_instance):
+    bot_instance.pending_clear_confirmation[1] = time.monotonic() - 1
+
+    with patch("bot.PENDING_CLEAR_MAX_ENTRIES", 2):
+        bot_instance._set_pending_clear(2)
+        bot_instance._set_pending_clear(3)
+        bot_instance._set_pending_clear(4)
+
+    assert list(bot_instance.pending_clear_confirmation) == [3, 4]
+
+
+@pytest.mark.asyncio
+async def test_handle_photo_formats_one_prebuilt_template(bot_instance):
+    update = MagicMock()
+    update.effective_user.first_name = "Ann"
+    update.message.reply_text = AsyncMock()
+    context = MagicMock()
+    context.bot.send_chat_action = AsyncMock()
+    bot_instance._rng = MagicMock()
+    bot_instance._rng.choice.side_effect = lambda templates: templates[0]
+
+    await bot_instance.handle_photo(update, context)
+
+    update.message.reply_text.assert_awaited_once()
+    assert update.message.reply_text.await_args.args[0].startswith("Wow Ann!")
+    context.bot.send_chat_action.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_cleanup_continues_after_cancelling_dispatcher(bot_instance):
+    bot_instance.message_dispatcher = MagicMock()
+    bot_instance.message_dispatcher.stop_dispatching = AsyncMock()
+    bot_instance.dispatcher_task = asyncio.create_task(asyncio.sleep(3600))
+    bot_instance.buffer_manager.stop = AsyncMock()
+    bot_instance.typing_manager.cleanup = AsyncMock()
+    bot_instance.conversation_manager.close = AsyncMock()
+    await asyncio.sleep(0)
+
+    await bot_instance.cleanup()
+
+    assert bot_instance.dispatcher_task.cancelled()
+    bot_instance.buffer_manager.stop.assert_awaited_once()
+    bot_instance.conversation_manager.close.assert_awaited_once()
+
+
+def test_run_uses_webhook_when_url_configured(bot_instance):
+    application = MagicMock()
+    bot_instance.build_application = MagicMock(side_effect=lambda: setattr(bot_instance, "application", application))
+
+    with patch("bot.TELEGRAM_WEBHOOK_URL", "https://example.com/tg/hook"), \
+         patch("bot.webhooks_available", return_value=True), \
+         patch("bot.install_event_loop_policy"), \
+         patch("bot.install_queue_logging", return_value=None):
+        bot_instance.run()
+
+    application.run_polling.assert_not_called()
+    kwargs = application.run_webhook.call_args.kwargs
+    assert kwargs["url_path"] == "tg/hook"
+    assert kwargs["webhook_url"] == "https://example.com/tg/hook"
+
+
+def test_run_names_the_webhooks_extra_when_tornado_is_missing(bot_instance):
+    application = MagicMock()
+    bot_instance.build_application = MagicMock(side_effect=lambda: setattr(bot_instance, "application", application))
+
+    with patch("bot.TELEGRAM_WEBHOOK_URL", "https://example.com/tg/hook"), \
+         patch("bot.webhooks_available", return_value=False), \
+         patch("bot.install_event_loop_policy"), \
+         patch("bot.install_queue_logging", return_value=None):
+        with pytest.raises(RuntimeError, match=r"python-telegram-bot\[webhooks\]"):
+            bot_instance.run()
+
+    application.run_webhook.assert_not_called()
+    application.run_polling.assert_not_called()
@@ -64,6 +64,17 @@ class TestUserBuffer:
         size = await user_buffer.get_buffer_size()
         assert size == 15
 
+    @pytest.mark.asyncio
+    async def test_discard_keeps_messages_added_later(self, user_buffer):
+        """Test that discarding read entries keeps messages added afterwards."""
+        await user_buffer.add_message("first")
+        read = await user_buffer.get_messages()
+        await user_buffer.add_message("second")
+
+        await user_buffer.discard(read)
+
+        assert [entry.message for entry in await user_buffer.get_messages()] == ["second"]
+
     @pytest.mark.asyncio
     async def test_is_empty(self, user_buffer):
         """Test checking if buffer is empty."""
@@ -323,7 +334,7 @@ class TestBufferManager:
         
         # Manually set last_activity to old time for user_1
         buffer_1 = buffer_manager.get_user_buffer(user_id_1)
-        buffer_1.last_activity = time.time() - 1000  # 1000 seconds ago
+        buffer_1.last_activity = time.monotonic() - 1000  # 1000 seconds ago
         
         # Cleanup buffers older than 500 seconds
         await buffer_manager.cleanup_inactive_buffers(max_age_seconds=500)
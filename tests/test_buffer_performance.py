@@ -68,7 +68,7 @@ class TestBufferPerformance:
         assert active_buffers == num_users
         
         # Make half of them inactive
-        cutoff_time = time.time() - 1000  # 1000 seconds ago
+        cutoff_time = time.monotonic() - 1000  # 1000 seconds ago
         for user_id in range(0, num_users, 2):  # Every other user
             buffer = buffer_manager.get_user_buffer(user_id)
             buffer.last_activity = cutoff_time
@@ -241,7 +241,7 @@ class TestBufferPerformance:
             await buffer_manager.add_message(user_id, f"Active message {user_id}")
         
         # Create inactive buffers with old timestamps
-        cutoff_time = time.time() - 10000  # 1000 seconds ago
+        cutoff_time = time.monotonic() - 10000  # 1000 seconds ago
         for user_id in range(num_active, total_buffers):
             await buffer_manager.add_message(user_id, f"Inactive message {user_id}")
             buffer = buffer_manager.get_user_buffer(user_id)
@@ -1,3 +1,4 @@
+import asyncio
 from unittest.mock import AsyncMock
 
 import pytest
@@ -16,3 +17,35 @@ async def test_ensure_model_loaded_returns_true_when_model_already_loaded():
 
     assert result is True
     manager.load_model.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_ensure_model_loaded_probes_model_and_server_together():
+    manager = LMStudioManager()
+    started = []
+
+    async def server_running():
+        started.append("server")
+        await asyncio.sleep(0)
+        assert "model" in started
+        return True
+
+    async def model_loaded(model_name):
+        started.append("model")
+        return True
+
+    manager.is_server_running = server_running
+    manager.is_model_loaded = model_loaded
+
+    assert await manager.ensure_model_loaded("test-model", auto_load=False) is True
+
+
+@pytest.mark.asyncio
+async def test_ensure_model_loaded_returns_false_when_server_down():
+    manager = LMStudioManager()
+    manager.is_server_running = AsyncMock(return_value=False)
+    manager.is_model_loaded = AsyncMock(return_value=False)
+    manager.load_model = AsyncMock()
+
+    assert await manager.ensure_model_loaded("test-model") is False
+    manager.load_model.assert_not_called()
@@ -97,7 +97,8 @@ class TestMessageDispatcher:
                 bot=mock_bot_instance,
                 typing_manager=mock_typing_manager_instance,
                 is_first_message=True,
-                route_key=f"{self.user_id}:default"
+                route_key=f"{self.user_id}:default",
+                send_limiter=dispatcher.send_limiter
             )
     
     @pytest.mark.asyncio
@@ -300,5 +301,62 @@ class TestMessageDispatcher:
                 assert mock_blpop.call_count <= 1
                 mock_process_message.assert_not_called()
 
+    @pytest.mark.asyncio
+    async def test_process_message_reuses_bot_per_token(self):
+        """Messages for the same custom token share one Bot instance."""
+        mock_bot_class = Mock(side_effect=lambda token: Mock(token=token))
+        mock_send_ai_response = AsyncMock()
+
+        with patch('redis.Redis.ping') as mock_ping, \
+             patch('message_manager.Bot', new=mock_bot_class), \
+             patch('message_manager.TypingIndicatorManager'), \
+             patch('message_manager.send_ai_response', new=mock_send_ai_response):
+            mock_ping.return_value = True
+            dispatcher = MessageDispatcher(self.redis_url)
+
+            message_data = {
+                "user_id": self.user_id,
+                "chat_id": self.chat_id,
+                "text": self.test_message,
+                "message_type": "regular",
+                "bot_token": "custom-token",
+            }
+            assert await dispatcher.process_message(dict(message_data)) is True
+            assert await dispatcher.process_message(dict(message_data)) is True
+
+            bots = [call.kwargs["bot"] for call in mock_send_ai_response.await_args_list]
+            assert bots[0] is bots[1]
+            assert bots[0].token == "custom-token"
+            # One Bot for the default token plus one for the custom token
+            assert mock_bot_class.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_process_message_paces_each_token_separately(self):
+        """Every bot token gets its own send limiter, reused across its messages."""
+        mock_send_ai_response = AsyncMock()
+
+        with patch('redis.Redis.ping') as mock_ping, \
+             patch('message_manager.Bot'), \
+             patch('message_manager.TypingIndicatorManager'), \
+             patch('message_manager.send_ai_response', new=mock_send_ai_response):
+            mock_ping.return_value = True
+            dispatcher = MessageDispatcher(self.redis_url)
+
+            for bot_token in ("token-a", "token-b", "token-a", None):
+                message_data = {
+                    "user_id": self.user_id,
+                    "chat_id": self.chat_id,
+                    "text": self.test_message,
+                    "message_type": "regular",
+                    "bot_token": bot_token,
+                }
+                assert await dispatcher.process_message(message_data) is True
+
+            limiters = [call.kwargs["send_limiter"] for call in mock_send_ai_response.await_args_list]
+            assert limiters[0] is limiters[2]
+            assert limiters[0] is not limiters[1]
+            assert limiters[3] is dispatcher.send_limiter
+            assert len({id(limiter) for limiter in limiters}) == 3
+
 if __name__ == "__main__":
     pytest.main([__file__])
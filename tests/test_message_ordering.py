@@ -18,7 +18,9 @@ async def test_message_splitting_and_ordering():
     # Create mock Redis client
     mock_redis = MagicMock()
     mock_redis.ping.return_value = True
-    mock_redis.rpush.return_value = 1
+    mock_pipe = MagicMock()
+    mock_pipe.__len__.return_value = 0
+    mock_redis.pipeline.return_value = mock_pipe
     mock_redis.llen.return_value = 0
     mock_redis.sadd.return_value = 1
     mock_redis.smembers.return_value = set()
@@ -46,7 +48,8 @@ async def test_message_splitting_and_ordering():
         )
         
         # Check how many parts were enqueued
-        rpush_calls = mock_redis.rpush.call_args_list
+        mock_redis.pipeline.assert_called_once_with(transaction=False)
+        rpush_calls = mock_pipe.rpush.call_args_list
         print(f"Number of message parts enqueued: {len(rpush_calls)}")
         
         # Verify each part has correct metadata
@@ -33,6 +33,15 @@ class TestMessageQueueManager:
             manager = MessageQueueManager(self.redis_url)
             assert manager.redis_client is not None
     
+    def test_init_reuses_shared_client(self):
+        """Test that a provided Redis client is reused instead of opening a new one."""
+        shared_client = Mock()
+        with patch('redis.from_url') as mock_from_url:
+            manager = MessageQueueManager(self.redis_url, redis_client=shared_client)
+        assert manager.redis_client is shared_client
+        mock_from_url.assert_not_called()
+        shared_client.ping.assert_called_once()
+    
     def test_init_failure(self):
         """Test failed initialization of MessageQueueManager."""
         with patch('redis.from_url') as mock_from_url:
@@ -48,11 +57,10 @@ class TestMessageQueueManager:
             manager = MessageQueueManager(self.redis_url)
             
             # Mock Redis methods
-            with patch.object(manager.redis_client, 'rpush') as mock_rpush, \
-                 patch.object(manager.redis_client, 'sadd') as mock_sadd:
+            with patch.object(manager.redis_client, 'pipeline') as mock_pipeline:
                 
-                mock_rpush.return_value = 1
-                mock_sadd.return_value = 1
+                mock_pipe = mock_pipeline.return_value
+                mock_pipe.__len__.return_value = 0
                 
                 await manager.enqueue_message(
                     user_id=self.user_id,
@@ -61,9 +69,11 @@ class TestMessageQueueManager:
                     message_type="regular"
                 )
                 
-                # Verify rpush was called with correct arguments
-                mock_rpush.assert_called_once()
-                args = mock_rpush.call_args[0]
+                # Verify the part and route were sent in a single pipeline flush
+                mock_pipeline.assert_called_once_with(transaction=False)
+                mock_pipe.execute.assert_called_once()
+                mock_pipe.rpush.assert_called_once()
+                args = mock_pipe.rpush.call_args[0]
                 assert args[0] == f"queue:{self.user_id}:default"
                 
                 # Verify the message content
@@ -77,7 +87,28 @@ class TestMessageQueueManager:
                 assert message_data["retry_count"] == 0
                 
                 # Verify sadd was called to add user to active users set
-                mock_sadd.assert_called_once_with("dispatcher:active_users", f"{self.user_id}:default")
+                mock_pipe.sadd.assert_called_once_with("dispatcher:active_users", f"{self.user_id}:default")
+    
+    @pytest.mark.asyncio
+    async def test_enqueue_message_flushes_at_pipeline_depth(self):
+        """Test that long replies flush the pipeline every pipeline_depth commands."""
+        with patch('redis.Redis.ping') as mock_ping:
+            mock_ping.return_value = True
+            manager = MessageQueueManager(self.redis_url, pipeline_depth=2)
+            
+            with patch.object(manager.redis_client, 'pipeline') as mock_pipeline:
+                mock_pipe = mock_pipeline.return_value
+                mock_pipe.__len__.side_effect = [1, 2, 1]
+                
+                await manager.enqueue_message(
+                    user_id=self.user_id,
+                    chat_id=self.chat_id,
+                    text="one\n\ntwo\n\nthree",
+                    message_type="regular"
+                )
+                
+                assert mock_pipe.rpush.call_count == 3
+                assert mock_pipe.execute.call_count == 2
     
     @pytest.mark.asyncio
     async def test_enqueue_message_validation_errors(self):
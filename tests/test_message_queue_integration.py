@@ -45,11 +45,11 @@ class TestMessageQueueIntegration:
                 bot.message_queue_manager = MessageQueueManager(self.redis_url)
                 
                 # Mock Redis methods
-                with patch.object(bot.message_queue_manager.redis_client, 'rpush') as mock_rpush, \
+                with patch.object(bot.message_queue_manager.redis_client, 'pipeline') as mock_pipeline, \
                      patch.object(bot.message_queue_manager.redis_client, 'sadd') as mock_sadd:
                     
-                    mock_rpush.return_value = 1
-                    mock_sadd.return_value = 1
+                    mock_pipe = mock_pipeline.return_value
+                    mock_pipe.__len__.return_value = 0
                     
                     # Test enqueueing a message through the bot's interface
                     # This simulates what happens in _dispatch_buffered_message
@@ -62,8 +62,10 @@ class TestMessageQueueIntegration:
                         )
                         
                         # Verify the message was enqueued
-                        mock_rpush.assert_called_once()
-                        args = mock_rpush.call_args[0]
+                        mock_pipe.rpush.assert_called_once()
+                        mock_pipe.sadd.assert_called_once_with("dispatcher:active_users", f"{self.user_id}:default")
+                        mock_sadd.assert_not_called()
+                        args = mock_pipe.rpush.call_args[0]
                         assert args[0] == f"queue:{self.user_id}:default"
                         
                         # Verify the message content
@@ -87,11 +89,11 @@ class TestMessageQueueIntegration:
             service.message_queue_manager = MessageQueueManager(self.redis_url)
             
             # Mock Redis methods
-            with patch.object(service.message_queue_manager.redis_client, 'rpush') as mock_rpush, \
+            with patch.object(service.message_queue_manager.redis_client, 'pipeline') as mock_pipeline, \
                  patch.object(service.message_queue_manager.redis_client, 'sadd') as mock_sadd:
                 
-                mock_rpush.return_value = 1
-                mock_sadd.return_value = 1
+                mock_pipe = mock_pipeline.return_value
+                mock_pipe.__len__.return_value = 0
                 
                 # Test enqueueing a proactive message
                 if service.message_queue_manager:
@@ -103,8 +105,9 @@ class TestMessageQueueIntegration:
                     )
                     
                     # Verify the message was enqueued
-                    mock_rpush.assert_called_once()
-                    args = mock_rpush.call_args[0]
+                    mock_pipe.rpush.assert_called_once()
+                    mock_pipe.execute.assert_called_once()
+                    args = mock_pipe.rpush.call_args[0]
                     assert args[0] == f"queue:{self.user_id}:default"
                     
                     # Verify the message content
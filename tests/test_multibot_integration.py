@@ -90,14 +90,14 @@ def test_multibot_adapter(mock_bot_cls, mock_bot_config):
 @patch('telegram.ext.MessageHandler')
 @patch('telegram.ext.CommandHandler')
 @patch('telegram.ext.Application.builder')
-def test_build_application_for_bot_registers_clear_watcher(
+def test_build_application_for_bot_registers_text_handler_first(
     mock_builder,
     mock_command_handler,
     mock_message_handler,
     mock_callback_handler,
     mock_filters,
 ):
-    """Test that multi-bot application wiring includes the /clear confirmation watcher."""
+    """Test that multi-bot application wiring checks plain text before the commands."""
     from multibot_adapter import build_application_for_bot
 
     mock_app = MagicMock()
@@ -113,7 +113,6 @@ def test_build_application_for_bot_registers_clear_watcher(
 
     class StubBot:
         def __init__(self):
-            self._monitor_pending_clear = MagicMock()
             self.start_command = MagicMock()
             self.help_command = MagicMock()
             self.clear_command = MagicMock()
@@ -136,9 +135,11 @@ def test_build_application_for_bot_registers_clear_watcher(
 
     build_application_for_bot(mock_bot, "token")
 
-    first_add_handler_call = mock_app.add_handler.call_args_list[0]
-    assert first_add_handler_call.kwargs["group"] == -1
-    mock_message_handler.assert_any_call(mock_filters.ALL, mock_bot._monitor_pending_clear)
+    assert mock_app.add_handler.call_args_list[0].args[0] is mock_message_handler.return_value
+    assert mock_message_handler.call_args_list[0].args[1] is mock_bot.handle_message
+    assert all("group" not in call.kwargs for call in mock_app.add_handler.call_args_list)
+    registered = {call.args[0] for call in mock_command_handler.call_args_list}
+    assert {"start", "ok", "deps"} <= registered
 
 @pytest.mark.asyncio
 async def test_vector_store_query_isolation():
@@ -136,22 +136,19 @@ async def _test_conversation_manager(db_url: str) -> bool:
         test_user_id = 789012
         
         # Add messages
-        manager.add_message(test_user_id, "user", "Hello from conversation manager!")
-        await asyncio.sleep(0.1)  # Give async operations time to complete
-        
-        manager.add_message(test_user_id, "assistant", "Hello! Nice to meet you through the conversation manager.")
-        await asyncio.sleep(0.1)
+        await manager.add_message_async(test_user_id, "user", "Hello from conversation manager!")
+        await manager.add_message_async(test_user_id, "assistant", "Hello! Nice to meet you through the conversation manager.")
         
         # Get conversation
-        conversation = manager.get_conversation(test_user_id)
+        conversation = await manager.get_conversation_async(test_user_id)
         logger.info("✓ Retrieved conversation with %d messages", len(conversation))
         
         # Get formatted conversation
-        formatted = manager.get_formatted_conversation(test_user_id)
+        formatted = await manager.get_formatted_conversation_async(test_user_id)
         logger.info("✓ Retrieved formatted conversation with %d messages", len(formatted))
         
         # Get user stats
-        stats = manager.get_user_stats(test_user_id)
+        stats = await manager.get_user_stats_async(test_user_id)
         logger.info("✓ Retrieved user stats: %d total messages", stats['total_messages'])
         
         # Clean up
@@ -172,6 +172,27 @@ def test_handle_user_message_persists_bot_id(proactive_service, mock_redis_clien
 
     assert state['bot_id'] == bot_id
 
+def test_handle_user_messages_bulk_resets_all_users_in_one_pipeline(proactive_service, mock_redis_client):
+    """Test that a batch of user messages is read with MGET and written through one pipeline."""
+    bot_id = "8c52d8d6-f8c7-4523-8f4c-44d468704d2c"
+    mock_redis_client.mget.return_value = [json.dumps({'cadence': '1d', 'consecutive_outreaches': 3}), None]
+    pipe = mock_redis_client.pipeline.return_value
+
+    proactive_service.handle_user_messages_bulk([801, 802], bot_id=bot_id)
+
+    mock_redis_client.mget.assert_called_once_with([
+        proactive_service._state_key(801, bot_id),
+        proactive_service._state_key(802, bot_id),
+    ])
+    assert pipe.set.call_count == 2
+    pipe.execute.assert_called_once()
+    mock_redis_client.set.assert_not_called()
+    for call in pipe.set.call_args_list:
+        state = json.loads(call.args[1])
+        assert state['cadence'] == CADENCE_LEVELS[0]
+        assert state['consecutive_outreaches'] == 0
+        assert state['bot_id'] == bot_id
+
 @pytest.mark.asyncio
 @patch('proactive_messaging.send_proactive_message.apply_async')
 async def test_manage_proactive_messages_schedules_same_user_per_bot(mock_apply_async, proactive_service, mock_redis_client):
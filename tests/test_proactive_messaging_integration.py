@@ -52,6 +52,7 @@ def bot_instance():
                     bot.conversation_manager = mock_cm_instance
                     bot.ai_handler = mock_ai_instance
                     bot.typing_manager = mock_tm_instance
+                    bot._initialize_memory_components = AsyncMock()
                     
                     yield bot
 
@@ -81,20 +82,22 @@ async def test_handle_message_triggers_proactive_messaging(bot_instance):
         
         mock_context = MagicMock()
         mock_context.bot = MagicMock()
+        bot_instance.application = MagicMock()
         
         # Mock conversation manager methods
         bot_instance.conversation_manager.add_message_async = AsyncMock()
-        bot_instance.conversation_manager.get_formatted_conversation_async = AsyncMock(return_value=[])
         mock_conversation = MagicMock()
         mock_conversation.id = uuid.uuid4()
-        bot_instance.conversation_manager._ensure_user_and_conversation = AsyncMock(return_value=mock_conversation)
+        bot_instance.conversation_manager.add_message_and_get_context_async = AsyncMock(
+            return_value=(mock_conversation, [])
+        )
         
         # Mock AI handler method
         bot_instance.ai_handler.generate_response = AsyncMock(return_value="Test response")
         
         # Mock proactive messaging service
         if bot_instance.proactive_messaging_service:
-            bot_instance.proactive_messaging_service.handle_user_message = MagicMock()
+            bot_instance.proactive_messaging_service.handle_user_messages_bulk = MagicMock()
         
         # Mock buffer manager dispatch method to simulate immediate dispatch
         original_dispatch = bot_instance.buffer_manager.dispatch_buffer
@@ -106,19 +109,17 @@ async def test_handle_message_triggers_proactive_messaging(bot_instance):
         # Manually trigger the dispatch since handle_message only adds to buffer
         await bot_instance._dispatch_buffered_message(12345)
         
-        # Check that proactive messaging service was called
+        # Check that the proactive reset was batched and flushed
         if bot_instance.proactive_messaging_service:
-            bot_instance.proactive_messaging_service.handle_user_message.assert_called_once_with(
-                12345,
+            await bot_instance._proactive_notify_task
+            bot_instance.proactive_messaging_service.handle_user_messages_bulk.assert_called_once_with(
+                {12345},
                 bot_id=bot_instance.bot_id
             )
 
-        bot_instance.conversation_manager.add_message_async.assert_any_call(
+        bot_instance.conversation_manager.add_message_and_get_context_async.assert_awaited_once_with(
             12345, "user", "Hello bot!", bot_id=bot_instance.bot_id
         )
-        bot_instance.conversation_manager.get_formatted_conversation_async.assert_awaited_once_with(
-            12345, bot_id=bot_instance.bot_id
-        )
         
         # Restore original dispatch method
         bot_instance.buffer_manager.dispatch_buffer = original_dispatch
@@ -136,13 +137,15 @@ async def test_handle_message_proactive_messaging_failure(bot_instance):
     
     mock_context = MagicMock()
     mock_context.bot = MagicMock()
+    bot_instance.application = MagicMock()
     
     # Mock conversation manager methods
     bot_instance.conversation_manager.add_message_async = AsyncMock()
-    bot_instance.conversation_manager.get_formatted_conversation_async = AsyncMock(return_value=[])
     mock_conversation = MagicMock()
     mock_conversation.id = uuid.uuid4()
-    bot_instance.conversation_manager._ensure_user_and_conversation = AsyncMock(return_value=mock_conversation)
+    bot_instance.conversation_manager.add_message_and_get_context_async = AsyncMock(
+        return_value=(mock_conversation, [])
+    )
     
     # Mock AI handler method
     bot_instance.ai_handler.generate_response = AsyncMock(return_value="Test response")
@@ -155,7 +158,7 @@ async def test_handle_message_proactive_messaging_failure(bot_instance):
         
         # Make proactive messaging service raise an exception
         if bot_instance.proactive_messaging_service:
-            bot_instance.proactive_messaging_service.handle_user_message = MagicMock(
+            bot_instance.proactive_messaging_service.handle_user_messages_bulk = MagicMock(
                 side_effect=Exception("Proactive messaging error")
             )
         
@@ -168,6 +171,7 @@ async def test_handle_message_proactive_messaging_failure(bot_instance):
             await bot_instance.handle_message(mock_update, mock_context)
             # Manually trigger the dispatch since handle_message only adds to buffer
             await bot_instance._dispatch_buffered_message(12345)
+            await bot_instance._proactive_notify_task
             success = True
         except Exception:
             success = False
@@ -16,7 +16,7 @@ from typing import List, Dict, Any
 from llama_index.core.schema import TextNode
 from storage.interfaces import Message, Memory
 from memory.manager import LlamaIndexMemoryManager as MemoryManager
-from prompt.assembler import PromptAssembler, TokenCounter, Tokenizer
+from prompt.assembler import PromptAssembler, PromptAssemblerConfig, PROMPT_ASSEMBLER_CONFIG, TokenCounter, Tokenizer
 import config
 
 
@@ -265,7 +265,7 @@ class TestPromptAssembler:
     async def test_memory_token_budgeting(self, prompt_assembler, sample_conversation_id, sample_memories):
         """Test that memory inclusion respects token budgeting"""
         # Setup with small memory budget
-        prompt_assembler.config["memory_token_budget_ratio"] = 0.1  # Very small budget
+        prompt_assembler.memory_token_budget_ratio = 0.1  # Very small budget
         prompt_assembler.message_repo.fetch_active_messages.return_value = []
         prompt_assembler.message_repo.get_last_user_message.return_value = None
         prompt_assembler.memory_manager.get_context.return_value = ""
@@ -477,6 +477,30 @@ class TestPromptAssembler:
 
 class TestEdgeCases:
     """Test edge cases and error handling"""
+
+    def test_config_accepts_frozen_settings_and_defaults_to_environment(self, mock_message_repo, mock_memory_manager, mock_tokenizer):
+        """Test that PromptAssemblerConfig and the shared environment config are both accepted"""
+        custom = PromptAssembler(
+            message_repo=mock_message_repo,
+            memory_manager=mock_memory_manager,
+            conversation_repo=AsyncMock(),
+            user_repo=AsyncMock(),
+            tokenizer=mock_tokenizer,
+            config=PromptAssemblerConfig(max_memory_items=7, include_system_template=False)
+        )
+        default = PromptAssembler(
+            message_repo=mock_message_repo,
+            memory_manager=mock_memory_manager,
+            conversation_repo=AsyncMock(),
+            user_repo=AsyncMock(),
+            tokenizer=mock_tokenizer,
+        )
+
+        assert custom.max_memory_items == 7
+        assert custom.include_system_template is False
+        assert default.max_memory_items == PROMPT_ASSEMBLER_CONFIG.max_memory_items
+        assert default.truncation_length == PROMPT_ASSEMBLER_CONFIG.truncation_length
+        assert default.config is PROMPT_ASSEMBLER_CONFIG
     
     @pytest.mark.asyncio
     async def test_repository_errors(self, prompt_assembler, sample_conversation_id):
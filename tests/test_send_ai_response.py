@@ -4,10 +4,12 @@ Tests for the send_ai_response function in ai_handler.py
 This module tests the message splitting functionality for various message lengths and formats.
 """
 
+import time
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 import textwrap
-from message_manager import send_ai_response, TypingIndicatorManager, clean_ai_response
+from message_manager import send_ai_response, SendRateLimiter, TypingIndicatorManager, clean_ai_response
 
 
 def simulate_send_ai_response(text):
@@ -233,6 +235,17 @@ class TestSendAIResponse:
             args, kwargs = call_args
             assert kwargs['text'] == expected_text
 
+    @pytest.mark.asyncio
+    async def test_send_limiter_paces_sends_beyond_burst(self):
+        """Sends past the bucket's burst wait for tokens to refill"""
+        limiter = SendRateLimiter(rate=20, burst=2)
+        start = time.monotonic()
+        for _ in range(4):
+            await limiter.acquire()
+
+        # Two sends ride the burst, the next two wait ~0.05s each
+        assert time.monotonic() - start >= 0.09
+
 
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main([__file__])
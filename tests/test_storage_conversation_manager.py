@@ -1,5 +1,5 @@
 from types import SimpleNamespace
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 import uuid
 
 import pytest
@@ -34,8 +34,9 @@ async def test_clear_conversation_deletes_default_bot_user_history():
     manager.storage.message_history.clear_user_history = AsyncMock(return_value=3)
     manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
 
-    await manager.clear_conversation_async(123)
+    deleted_count = await manager.clear_conversation_async(123)
 
+    assert deleted_count == 4
     manager.storage.messages.delete_messages.assert_awaited_once_with("conv-1")
     manager.storage.message_history.clear_user_history.assert_awaited_once_with(
         uuid.uuid5(uuid.NAMESPACE_OID, "telegram_user_123"),
@@ -57,3 +58,208 @@ async def test_clear_conversation_deletes_bot_scoped_user_history():
     await manager.clear_conversation_async(123, bot_id=bot_id)
 
     manager.storage.message_history.clear_user_history.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_clear_conversation_raises_and_drops_caches_when_history_clear_fails():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+
+    manager.storage = MagicMock()
+    manager.storage.messages.delete_messages = AsyncMock(return_value=4)
+    manager.storage.message_history.clear_user_history = AsyncMock(side_effect=RuntimeError("db down"))
+    manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
+    manager._message_count_cache[(123, None)] = (4, float("inf"))
+    manager._cache_formatted(123, None, [{"role": "user", "content": "hello"}], [2])
+
+    with pytest.raises(RuntimeError):
+        await manager.clear_conversation_async(123)
+
+    assert (123, None) not in manager._message_count_cache
+    assert (123, None) not in manager._formatted_cache
+
+
+@pytest.mark.asyncio
+async def test_conversation_exists_uses_cached_count_until_messages_change():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+
+    manager.storage = MagicMock()
+    manager.storage.messages.count_active_messages = AsyncMock(side_effect=[0, 1])
+    manager.storage.messages.append_message = AsyncMock()
+    manager.storage.message_history.save_message = AsyncMock()
+    manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
+
+    assert await manager.conversation_exists_async(123) is False
+    assert await manager.conversation_exists_async(123) is False
+    manager.storage.messages.count_active_messages.assert_awaited_once_with("conv-1", None)
+
+    await manager.add_message_async(123, "user", "hello")
+
+    assert await manager.conversation_exists_async(123) is True
+    assert manager.storage.messages.count_active_messages.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_message_count_cache_evicts_least_recently_used():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+
+    manager.storage = MagicMock()
+    manager.storage.messages.count_active_messages = AsyncMock(return_value=1)
+    manager._ensure_user_and_conversation = AsyncMock(return_value=SimpleNamespace(id="conv-1"))
+
+    with patch("storage_conversation_manager.CONVERSATION_CACHE_MAX_ENTRIES", 2):
+        await manager.get_message_count_async(1)
+        await manager.get_message_count_async(2)
+        await manager.get_message_count_async(1)
+        await manager.get_message_count_async(3)
+
+    assert list(manager._message_count_cache) == [(1, None), (3, None)]
+
+
+@pytest.mark.asyncio
+async def test_message_count_raises_on_storage_error():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+
+    manager.storage = MagicMock()
+    manager.storage.messages.count_active_messages = AsyncMock(side_effect=RuntimeError("db down"))
+    manager._ensure_user_and_conversation = AsyncMock(return_value=SimpleNamespace(id="conv-1"))
+
+    with pytest.raises(RuntimeError):
+        await manager.conversation_exists_async(123)
+    assert (123, None) not in manager._message_count_cache
+
+
+@pytest.mark.asyncio
+async def test_add_message_and_get_context_resolves_conversation_once():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+    stored = SimpleNamespace(role="user", content="hello", token_count=2)
+
+    manager.storage = MagicMock()
+    manager.storage.messages.append_message = AsyncMock()
+    manager.storage.messages.fetch_recent_messages = AsyncMock(return_value=[stored])
+    manager.storage.message_history.save_message = AsyncMock()
+    manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
+
+    result = await manager.add_message_and_get_context_async(123, "user", "hello")
+
+    assert result == (conversation, [{"role": "user", "content": "hello"}])
+    manager._ensure_user_and_conversation.assert_awaited_once_with(123, bot_id=None)
+    manager.storage.messages.append_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_shared_storage_is_not_closed_by_manager():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    shared_storage = MagicMock()
+    shared_storage.close = AsyncMock()
+
+    manager.use_shared_storage(shared_storage)
+    await manager.initialize()
+    assert manager.storage is shared_storage
+
+    await manager.close()
+
+    shared_storage.close.assert_not_called()
+    assert manager.storage is None
+
+
+@pytest.mark.asyncio
+async def test_add_message_reuses_resolved_conversation():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+
+    manager.storage = MagicMock()
+    manager.storage.messages.append_message = AsyncMock()
+    manager.storage.message_history.save_message = AsyncMock()
+    manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
+
+    await manager.add_message_async(123, "assistant", "hi", conversation=conversation)
+
+    manager._ensure_user_and_conversation.assert_not_awaited()
+    manager.storage.messages.append_message.assert_awaited_once_with(
+        conversation_id="conv-1",
+        role="assistant",
+        content="hi",
+        extra_data={"telegram_user_id": 123},
+    )
+
+
+@pytest.mark.asyncio
+async def test_add_message_survives_history_mirror_failure():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+    stored = SimpleNamespace(id="msg-1")
+
+    manager.storage = MagicMock()
+    manager.storage.messages.append_message = AsyncMock(return_value=stored)
+    manager.storage.message_history.save_message = AsyncMock(side_effect=RuntimeError("history down"))
+
+    assert await manager.add_message_async(123, "user", "hello", conversation=conversation) is stored
+    manager.storage.message_history.save_message.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_formatted_conversation_cache_absorbs_appended_messages():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    conversation = SimpleNamespace(id="conv-1")
+
+    manager.storage = MagicMock()
+    manager.storage.messages.append_message = AsyncMock(
+        return_value=SimpleNamespace(role="assistant", content="hi", token_count=3)
+    )
+    manager.storage.message_history.save_message = AsyncMock()
+    manager._ensure_user_and_conversation = AsyncMock(return_value=conversation)
+    manager._format_recent_messages = AsyncMock(return_value=([{"role": "user", "content": "hello"}], [2]))
+
+    assert await manager.get_formatted_conversation_async(123) == [{"role": "user", "content": "hello"}]
+    await manager.add_message_async(123, "assistant", "hi", conversation=conversation)
+
+    assert await manager.get_formatted_conversation_async(123) == [
+        {"role": "user", "content": "hello"},
+        {"role": "assistant", "content": "hi"},
+    ]
+    manager._format_recent_messages.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_formatted_conversation_cache_trims_to_history_budget():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+    manager._cache_formatted(123, None, [{"role": "user", "content": "old"}, {"role": "assistant", "content": "mid"}], [4, 3])
+
+    with patch("storage_conversation_manager.AVAILABLE_HISTORY_TOKENS", 8):
+        manager._extend_formatted_cache(123, None, SimpleNamespace(role="user", content="new", token_count=5))
+
+    assert await manager.get_formatted_conversation_async(123) == [
+        {"role": "assistant", "content": "mid"},
+        {"role": "user", "content": "new"},
+    ]
+
+
+def test_formatted_conversation_cache_evicts_beyond_cap():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+
+    with patch("storage_conversation_manager.CONVERSATION_CACHE_MAX_ENTRIES", 3):
+        for user_id in range(5):
+            manager._cache_formatted(user_id, None, [{"role": "user", "content": "hi"}], [1])
+        assert manager._cached_formatted(2, None) is not None
+        manager._cache_formatted(5, None, [{"role": "user", "content": "hi"}], [1])
+
+    assert list(manager._formatted_cache) == [(4, None), (2, None), (5, None)]
+    assert manager._cached_formatted(0, None) is None
+
+
+@pytest.mark.asyncio
+async def test_add_message_skips_history_mirror_when_insert_fails():
+    manager = PostgresConversationManager("postgresql://u:p@h:5432/db", use_pgvector=False)
+
+    manager.storage = MagicMock()
+    manager.storage.messages.append_message = AsyncMock(side_effect=RuntimeError("insert failed"))
+    manager.storage.message_history.save_message = AsyncMock()
+    manager._ensure_user_and_conversation = AsyncMock(return_value=SimpleNamespace(id="conv-1"))
+
+    with pytest.raises(RuntimeError):
+        await manager.add_message_async(123, "user", "hello")
+
+    manager.storage.message_history.save_message.assert_not_awaited()
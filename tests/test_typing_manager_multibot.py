@@ -54,3 +54,22 @@ async def test_typing_indicator_manager_reports_and_cleans_up_real_chat_ids():
 
     assert not typing_manager.is_typing_active(12345, route_key="12345:bot-a")
     assert not typing_manager.is_typing_active(67890, route_key="67890:bot-b")
+
+
+@pytest.mark.asyncio
+async def test_typing_indicator_manager_debounces_rapid_restarts():
+    typing_manager = TypingIndicatorManager()
+
+    bot = AsyncMock()
+    bot.send_chat_action = AsyncMock()
+
+    await typing_manager.start_typing(bot, 12345, route_key="12345:bot-a")
+    first_task = typing_manager._active_typing_tasks["12345:bot-a"]
+    await asyncio.sleep(0)
+    await typing_manager.start_typing(bot, 12345, route_key="12345:bot-a")
+    await asyncio.sleep(0)
+
+    assert typing_manager._active_typing_tasks["12345:bot-a"] is first_task
+    assert bot.send_chat_action.await_count == 1
+
+    await typing_manager.cleanup()